@@ -0,0 +1,240 @@
+'''Play lots of games with an AI player, without a window, spread over all
+the processor cores, and report statistics about them.
+
+    python batch.py -n 10000 --ai exact --width 30 --height 16 --mines 99
+
+Every game's board and AI have their own random streams, spawned from the
+batch's root seed (see game_seeds()), so a batch run with the same settings
+plays exactly the same games, however they are spread over processes.
+To compare solvers on a fixed set of boards, generate a corpus once (see
+corpus.py) and play on it with --corpus.'''
+import argparse, json, os, time
+from dataclasses import dataclass, asdict, replace
+from multiprocessing import Pool
+
+import numpy as np
+
+from corpus import Corpus
+from engine import MinesweeperEngine
+from minesweeper_ai import BasicRulesetAI, ExactProbabilityAI
+from records import GameRecord, RecordWriter
+
+AI_CLASSES = {'basic': BasicRulesetAI, 'exact': ExactProbabilityAI}
+
+@dataclass
+class BatchSettings:
+    ai : str = 'basic' #a key of AI_CLASSES
+    grid_width : int = 30
+    grid_height : int = 16
+    mine_number : int = None
+    mine_density : float = 0.17
+    first_click : str = 'relocate' #see MinesweeperEngine
+
+def game_seeds(root_seed, game_index):
+    '''Seeds for game number game_index of a batch: independent streams for
+    the board and for the AI, spawned from the root seed. Any game from a
+    batch can be replayed on its own with them:
+        board_seed, ai_seed = game_seeds(root_seed, i)
+        ai_player = BasicRulesetAI(seed=ai_seed)
+        ai_player.play_game(MinesweeperEngine(..., seed=board_seed))
+    -> board_seed, ai_seed (np.random.SeedSequence)'''
+    #the same as SeedSequence(root_seed).spawn(n)[game_index], for any n
+    game_seed = np.random.SeedSequence(root_seed, spawn_key=(game_index,))
+    board_seed, ai_seed = game_seed.spawn(2)
+    return board_seed, ai_seed
+
+def play_games(settings, root_seed, game_indices, records=None, corpus=None):
+    '''Play the games with these numbers from a batch, in this process.
+    If `records` is a list, a GameRecord of every game is added to it.
+    If a Corpus is given, game i is played on its board i (and the board
+    settings are ignored).
+    -> list of GameResult, in the same order as game_indices'''
+    ai_player = AI_CLASSES[settings.ai]()
+    results = []
+    for i in game_indices:
+        board_seed, ai_seed = game_seeds(root_seed, i)
+        if corpus is None:
+            game = MinesweeperEngine(settings.grid_width, settings.grid_height,
+                                     mine_number=settings.mine_number,
+                                     mine_density=settings.mine_density,
+                                     seed=board_seed,
+                                     first_click=settings.first_click,
+                                     record_moves=records is not None)
+        else:
+            #the seed is only used if the first click is on a mine
+            game = corpus.new_engine(i, seed=board_seed,
+                                     record_moves=records is not None)
+        ai_player.set_seed(ai_seed)
+        results.append(ai_player.play_game(game))
+        if records is not None:
+            records.append(GameRecord.from_engine(game, root_seed, i))
+    return results
+
+def _play_games_task(args):
+    #Pool.imap only passes one argument
+    settings, root_seed, game_indices, record, corpus = args
+    records = [] if record else None
+    return (play_games(settings, root_seed, game_indices, records, corpus),
+            records)
+
+@dataclass
+class BatchReport:
+    settings : BatchSettings
+    root_seed : int
+    processes : int
+    wall_seconds : float
+    results : list #of GameResult, in game order
+    corpus : str = None #file path of the corpus the boards came from
+
+    @property
+    def games(self):
+        return len(self.results)
+    @property
+    def wins(self):
+        return sum(1 for r in self.results if r.won)
+    @property
+    def losses(self):
+        return self.games - self.wins
+    @property
+    def win_rate(self):
+        return self.wins / self.games if self.games else 0.0
+
+    def mean(self, field):
+        '''Average of a GameResult field over all games'''
+        if not self.results:
+            return 0.0
+        return sum(getattr(r, field) for r in self.results) / self.games
+
+    def summary(self):
+        '''-> dict of aggregated statistics (no per-game results)'''
+        return {
+            'ai' : self.settings.ai,
+            'grid_width' : self.settings.grid_width,
+            'grid_height' : self.settings.grid_height,
+            'mine_number' : self.settings.mine_number,
+            'mine_density' : self.settings.mine_density,
+            'first_click' : self.settings.first_click,
+            'corpus' : self.corpus,
+            'root_seed' : self.root_seed,
+            'processes' : self.processes,
+            'games' : self.games,
+            'wins' : self.wins,
+            'losses' : self.losses,
+            'win_rate' : self.win_rate,
+            'mean_moves' : self.mean('moves'),
+            'mean_guesses' : self.mean('guesses'),
+            'mean_game_seconds' : self.mean('seconds'),
+            'wall_seconds' : self.wall_seconds,
+            'games_per_second' : (self.games / self.wall_seconds
+                                  if self.wall_seconds else 0.0),
+        }
+
+    def to_json(self, filepath):
+        save_obj = {'summary' : self.summary(),
+                    'games' : [asdict(r) for r in self.results]}
+        with open(filepath, mode='w') as file:
+            json.dump(save_obj, file, indent=4)
+
+    def __str__(self):
+        s = self.summary()
+        return '\n'.join((
+            f"{s['games']} games of {s['grid_width']}x{s['grid_height']} "
+            f"with {s['ai']} AI (root seed {s['root_seed']})",
+            f"Wins: {s['wins']}  Losses: {s['losses']}  "
+            f"Win rate: {s['win_rate']:.2%}",
+            f"Per game: {s['mean_moves']:.1f} moves, "
+            f"{s['mean_guesses']:.2f} guesses, "
+            f"{1000 * s['mean_game_seconds']:.2f} ms",
+            f"Total: {s['wall_seconds']:.2f} s on {s['processes']} processes "
+            f"({s['games_per_second']:.1f} games/s)",
+        ))
+
+def run_batch(num_games, settings=None, root_seed=None, processes=None,
+              chunk_size=None, record_path=None, corpus=None):
+    '''Play num_games games, spread over a pool of `processes` worker
+    processes (default: one per core). Game i is seeded by
+    game_seeds(root_seed, i). If root_seed is None, a random one is chosen
+    (and put in the report).
+    If record_path is given, a record of every game is appended to that log
+    file, in game order (see records.py).
+    If a Corpus is given, game i is played on its board i, instead of on a
+    board generated from the settings.
+    -> BatchReport'''
+    if settings is None:
+        settings = BatchSettings()
+    if corpus is not None:
+        assert num_games <= len(corpus),\
+               f'The corpus only has {len(corpus)} boards'
+        grid_width, grid_height = corpus.board_size(0)
+        settings = replace(settings, grid_width=grid_width,
+                           grid_height=grid_height, mine_density=None,
+                           mine_number=int(corpus.index[0]['mine_number']))
+    if root_seed is None:
+        root_seed = np.random.SeedSequence().entropy
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if chunk_size is None:
+        #a few chunks per process evens out the load
+        chunk_size = max(1, num_games // (4 * processes))
+    tasks = [(settings, root_seed, range(i, min(i + chunk_size, num_games)),
+              record_path is not None, corpus)
+             for i in range(0, num_games, chunk_size)]
+
+    start_time = time.perf_counter()
+    results = []
+    writer = RecordWriter(record_path) if record_path is not None else None
+    def add_chunk(chunk):
+        chunk_results, chunk_records = chunk
+        results.extend(chunk_results)
+        if writer is not None:
+            for record in chunk_records:
+                writer.write(record)
+    if processes == 1:
+        for task in tasks:
+            add_chunk(_play_games_task(task))
+    else:
+        with Pool(processes) as pool:
+            for chunk in pool.imap(_play_games_task, tasks):
+                add_chunk(chunk)
+    if writer is not None:
+        writer.close()
+    wall_seconds = time.perf_counter() - start_time
+    return BatchReport(settings, root_seed, processes, wall_seconds, results,
+                       corpus.filepath if corpus is not None else None)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', '--games', type=int, default=None,
+                        help='number of games (default 1000, or every '
+                             'board in the corpus)')
+    parser.add_argument('--ai', choices=sorted(AI_CLASSES), default='basic')
+    parser.add_argument('--width', type=int, default=30)
+    parser.add_argument('--height', type=int, default=16)
+    parser.add_argument('--mines', type=int, default=None,
+                        help='number of mines (overrides --density)')
+    parser.add_argument('--density', type=float, default=0.17)
+    parser.add_argument('--first-click', default='relocate',
+                        choices=MinesweeperEngine.FIRST_CLICK_POLICIES)
+    parser.add_argument('--seed', type=int, default=None, help='root seed')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--json', default=None,
+                        help='also save the report (with every game) here')
+    parser.add_argument('--record', default=None,
+                        help='append a record of every game to this log file')
+    parser.add_argument('--corpus', default=None,
+                        help='play on the boards in this corpus file (see '
+                             'corpus.py), instead of random ones')
+    args = parser.parse_args()
+
+    corpus = Corpus(args.corpus) if args.corpus is not None else None
+    num_games = args.games
+    if num_games is None:
+        num_games = len(corpus) if corpus is not None else 1000
+
+    settings = BatchSettings(args.ai, args.width, args.height,
+                             args.mines, args.density, args.first_click)
+    report = run_batch(num_games, settings, args.seed, args.processes,
+                       record_path=args.record, corpus=corpus)
+    print(report)
+    if args.json is not None:
+        report.to_json(args.json)
@@ -0,0 +1,291 @@
+'''Time the hot paths of the engine, the solver and the display on seeded
+boards, and save the results so they can be compared between revisions.
+
+    python benchmark.py -o before.json
+    ...make some changes...
+    python benchmark.py -o after.json --compare before.json
+
+Every board is generated from a fixed seed, so two runs time exactly the
+same work. Each benchmark is repeated and the minimum and median times per
+call are reported: compare medians, and be suspicious of differences of a
+few percent (run again, or use --repeat).'''
+import os
+#the display benchmarks don't need a real window
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
+
+import argparse, json, platform, statistics, subprocess, sys, time
+import numpy as np
+
+from engine import MinesweeperEngine
+from minesweeper_ai import (BasicRulesetAI, RulesetAnalysis,
+                            analyse_with_ruleset, estimate_probs)
+
+#name: (grid_width, grid_height, mine_number)
+BOARDS = {
+    'beginner' : (9, 9, 10),
+    'intermediate' : (16, 16, 40),
+    'expert' : (30, 16, 99),
+    'huge' : (100, 100, 1600),
+    'giant' : (500, 500, 40000),
+}
+#the boards run by default. A game on the giant board takes seconds, so it is
+# only run when asked for (--boards giant)
+DEFAULT_BOARDS = ('beginner', 'intermediate', 'expert', 'huge')
+SEED = 12345
+
+#------------------------------------ TIMING -----------------------------------
+
+def time_calls(function, setup=None, repeat=20):
+    '''Call function() `repeat` times, calling setup() (untimed) before each
+    call if it is given.
+    -> list of seconds taken by each call'''
+    times = []
+    for i in range(repeat):
+        if setup is not None:
+            setup()
+        start_time = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start_time)
+    return times
+
+def summarise(times, **extra):
+    '''-> dict of statistics (in seconds) of a list of timings'''
+    result = {
+        'calls' : len(times),
+        'min' : min(times),
+        'median' : statistics.median(times),
+        'mean' : statistics.fmean(times),
+    }
+    result.update(extra)
+    return result
+
+#---------------------------------- FIXTURES -----------------------------------
+
+def make_engine(board, seed=SEED):
+    grid_width, grid_height, mine_number = BOARDS[board]
+    return MinesweeperEngine(grid_width, grid_height,
+                             mine_number=mine_number, seed=seed)
+
+def find_opening(engine):
+    '''-> (x, y) of the empty square (no adjacent mines) nearest the centre
+    of the board, which will start an opening when clicked'''
+    empty = np.argwhere(engine._grid == 0)
+    assert len(empty), 'Board has no empty squares'
+    centre = np.array([engine.grid_width, engine.grid_height]) / 2
+    x, y = empty[np.argmin(np.sum((empty - centre)**2, axis=1))]
+    return int(x), int(y)
+
+class _RecordingAI(BasicRulesetAI):
+    '''Keeps a copy of every position where it had to guess (apart from the
+    first move), which are the positions where the solver does the most work'''
+    def reset_solver(self):
+        super().reset_solver()
+        if not hasattr(self, 'positions'):
+            self.positions = []
+
+    def get_mine_probs(self):
+        if np.any(self.grid >= 0):
+            self.positions.append((self.grid.copy(),
+                                   self.game.get_mine_number(),
+                                   self.game.get_mine_counter()))
+        return super().get_mine_probs()
+
+def solver_positions(board, num_positions, seed=SEED):
+    '''Play seeded games until num_positions positions where the solver had
+    to guess have been seen.
+    -> list of (grid, num_mines, mine_counter)'''
+    ai_player = _RecordingAI()
+    ai_player.positions = []
+    game_seed = seed
+    while len(ai_player.positions) < num_positions:
+        ai_player.set_seed(game_seed)
+        ai_player.play_game(make_engine(board, game_seed))
+        game_seed += 1
+    return ai_player.positions[:num_positions]
+
+#--------------------------------- BENCHMARKS ----------------------------------
+
+def bench_new_game(board, repeat):
+    engine = make_engine(board)
+    return summarise(time_calls(engine.new_game, repeat=repeat))
+
+def bench_splash(board, repeat):
+    #the same mines every time, so every call opens the same squares
+    engine = make_engine(board)
+    engine = MinesweeperEngine(engine.grid_width, engine.grid_height,
+                               mine_density=None, mine_locations=engine.mines)
+    x, y = find_opening(engine)
+    def setup():
+        engine.new_game()
+        engine._open(x, y)
+    times = time_calls(lambda: engine._splash(x, y), setup, repeat)
+    return summarise(times, squares_opened=int(np.sum(engine._view != -1)))
+
+def bench_get_grid(board, repeat):
+    engine = make_engine(board)
+    engine.open_square_with_splash(*find_opening(engine))
+    output_grid = np.empty((engine.grid_width, engine.grid_height), dtype=int)
+    return summarise(time_calls(lambda: engine.get_grid(output_grid),
+                                repeat=repeat))
+
+def bench_analyse_with_ruleset(board, repeat, positions):
+    times = []
+    rule_applications = 0
+    for grid, num_mines, mine_counter in positions:
+        times.extend(time_calls(lambda: analyse_with_ruleset(grid, num_mines),
+                                repeat=max(1, repeat // len(positions))))
+        rule_applications += RulesetAnalysis(grid, num_mines).rule_applications
+    return summarise(times, positions=len(positions),
+                     rule_applications=rule_applications / len(positions))
+
+def bench_estimate_probs(board, repeat, positions):
+    times = []
+    for grid, num_mines, mine_counter in positions:
+        is_possible, *analysis = analyse_with_ruleset(grid, num_mines)
+        assert is_possible
+        times.extend(time_calls(lambda: estimate_probs(grid, *analysis[:2],
+                                                       mine_counter,
+                                                       *analysis[2:]),
+                                repeat=max(1, repeat // len(positions))))
+    return summarise(times, positions=len(positions))
+
+def bench_ai_game(board, num_games):
+    ai_player = BasicRulesetAI()
+    times = []
+    moves = 0
+    for game_seed in range(SEED, SEED + num_games):
+        ai_player.set_seed(game_seed)
+        result = ai_player.play_game(make_engine(board, game_seed))
+        times.append(result.seconds)
+        moves += result.moves
+    return summarise(times, wins=ai_player.win_count, moves=moves)
+
+def load_app_module():
+    '''-> the minesweeper.pyw module (which isn't importable by name on every
+    platform)'''
+    try:
+        import minesweeper
+    except ImportError:
+        import importlib.machinery, importlib.util
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'minesweeper.pyw')
+        loader = importlib.machinery.SourceFileLoader('minesweeper', path)
+        spec = importlib.util.spec_from_loader('minesweeper', loader)
+        minesweeper = importlib.util.module_from_spec(spec)
+        sys.modules['minesweeper'] = minesweeper
+        loader.exec_module(minesweeper)
+    return minesweeper
+
+def bench_draw(board, repeat):
+    ms = load_app_module()
+    ms.pygame.init()
+    ms.pygame.font.init()
+    window = ms.pygame.display.set_mode((800, 500))
+    settings = ms.Settings(ms.SETTINGS_FILEPATH)
+    settings.grid_width, settings.grid_height, settings.mine_number = \
+                         BOARDS[board]
+    settings.mine_locations = None
+    app = ms.MinesweeperApp(window, settings)
+    minesweeper_grid = app.minesweeper_grid
+    minesweeper_grid.engine = make_engine(board)
+    minesweeper_grid.engine.open_square_with_splash(
+        *find_opening(minesweeper_grid.engine))
+    #every square, as when the window is first drawn
+    times = time_calls(minesweeper_grid.draw, minesweeper_grid.mark_all_dirty,
+                       repeat)
+    #a frame where nothing has changed
+    idle_times = time_calls(minesweeper_grid.draw, repeat=repeat)
+    ms.pygame.quit()
+    return summarise(times, idle_median=statistics.median(idle_times))
+
+BENCHMARKS = ('new_game', 'splash', 'get_grid', 'analyse_with_ruleset',
+              'estimate_probs', 'ai_game', 'draw')
+
+def run_benchmarks(boards=DEFAULT_BOARDS, names=BENCHMARKS, repeat=20, num_games=20,
+                   num_positions=10, verbose=True):
+    '''-> dict of results, keyed by "benchmark/board"'''
+    results = {}
+    for board in boards:
+        positions = None
+        for name in names:
+            if name in ('analyse_with_ruleset', 'estimate_probs'):
+                if positions is None:
+                    positions = solver_positions(board, num_positions)
+                result = globals()['bench_' + name](board, repeat, positions)
+            elif name == 'ai_game':
+                result = bench_ai_game(board, num_games)
+            else:
+                result = globals()['bench_' + name](board, repeat)
+            key = name + '/' + board
+            results[key] = result
+            if verbose:
+                print(f"{key:36} median {1000*result['median']:10.3f} ms"
+                      f"   min {1000*result['min']:10.3f} ms")
+    return results
+
+#------------------------------------ OUTPUT -----------------------------------
+
+def environment_info():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                  capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))
+                                  ).stdout.strip() or None
+    except OSError:
+        revision = None
+    return {
+        'revision' : revision,
+        'date' : time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python' : platform.python_version(),
+        'numpy' : np.__version__,
+        'platform' : platform.platform(),
+        'seed' : SEED,
+    }
+
+def compare(old_results, new_results, threshold=0.1):
+    '''Print the change in median time of every benchmark found in both
+    results. Changes bigger than `threshold` (as a fraction) are marked.'''
+    print(f"{'benchmark':36} {'old (ms)':>10} {'new (ms)':>10} {'change':>8}")
+    for key, new in new_results.items():
+        if key not in old_results:
+            continue
+        old_median, new_median = old_results[key]['median'], new['median']
+        change = new_median / old_median - 1
+        mark = ''
+        if change > threshold:
+            mark = '  slower'
+        elif change < -threshold:
+            mark = '  faster'
+        print(f"{key:36} {1000*old_median:10.3f} {1000*new_median:10.3f} "
+              f"{change:+8.1%}{mark}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-o', '--output', default=None,
+                        help='save the results to this JSON file')
+    parser.add_argument('--compare', default=None,
+                        help='JSON file of earlier results to compare with')
+    parser.add_argument('--boards', nargs='+', choices=list(BOARDS),
+                        default=list(DEFAULT_BOARDS))
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS,
+                        default=BENCHMARKS, help='benchmarks to run')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='calls timed per benchmark')
+    parser.add_argument('--games', type=int, default=20,
+                        help='games played by the ai_game benchmark')
+    args = parser.parse_args()
+
+    #images, fonts and settings.json are found relative to the repository
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    results = run_benchmarks(args.boards, args.only, args.repeat, args.games)
+    if args.output is not None:
+        with open(args.output, mode='w') as file:
+            json.dump({'environment' : environment_info(),
+                       'results' : results}, file, indent=4)
+    if args.compare is not None:
+        with open(args.compare) as file:
+            old = json.load(file)
+        print()
+        compare(old['results'], results)
@@ -0,0 +1,149 @@
+'''A fixed corpus of pre-generated boards, for evaluating solvers on exactly
+the same boards every time without generating them again. The boards are
+stored as packed mine bitmaps in one file, which is memory-mapped when it is
+loaded: nothing is read until a board is used, and worker processes using
+the same corpus share the operating system's copy of it instead of each
+holding their own.
+
+    python corpus.py expert.corpus -n 100000 --width 30 --height 16 --mines 99
+    python batch.py --corpus expert.corpus --ai exact
+
+    corpus = Corpus('expert.corpus')
+    result = ai_player.play_game(corpus.new_engine(i))
+
+File format (numbers are little-endian):
+    header  - see CORPUS_HEADER: FILE_MAGIC, number of boards (u64),
+              seed the boards were generated from (u128)
+    index   - one INDEX_DTYPE entry per board: where its bitmap starts in the
+              file, its grid_width, grid_height and mine_number
+    bitmaps - the mines of each board, one bit per square in flat index order
+              (x * grid_height + y), packed by np.packbits'''
+import argparse, os, struct
+
+import numpy as np
+
+from engine import MineGenerator, MinesweeperEngine
+
+FILE_MAGIC = b'MSWPCRP1'
+CORPUS_HEADER = struct.Struct('<8sQ16s')
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('grid_width', '<u2'),
+                        ('grid_height', '<u2'), ('mine_number', '<u4')])
+
+def create_corpus(filepath, num_boards, grid_width, grid_height,
+                  mine_number=None, mine_density=0.17, seed=None,
+                  chunk_size=4096):
+    '''Generate num_boards random boards, and save them to a new corpus file
+    (overwriting it if it exists). The boards are written straight to the
+    memory-mapped file, chunk_size boards at a time.
+    seed - an int (< 2**128), or None for a random one
+    -> Corpus'''
+    assert num_boards > 0, 'A corpus needs at least one board'
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    assert 0 <= seed < 2**128, 'Seed should fit in 128 bits'
+    generator = MineGenerator(grid_width, grid_height, initial_seed=seed)
+    generator.use_settings(mine_number=mine_number, mine_density=mine_density)
+    num_squares = grid_width * grid_height
+    board_bytes = (num_squares + 7) // 8
+    bitmaps_offset = CORPUS_HEADER.size + num_boards * INDEX_DTYPE.itemsize
+
+    file = np.memmap(filepath, dtype=np.uint8, mode='w+',
+                     shape=(bitmaps_offset + num_boards * board_bytes,))
+    file[:CORPUS_HEADER.size] = np.frombuffer(CORPUS_HEADER.pack(
+        FILE_MAGIC, num_boards, seed.to_bytes(16, 'little')), dtype=np.uint8)
+    index = file[CORPUS_HEADER.size:bitmaps_offset].view(INDEX_DTYPE)
+    index['offset'] = bitmaps_offset + board_bytes * np.arange(num_boards)
+    index['grid_width'] = grid_width
+    index['grid_height'] = grid_height
+    index['mine_number'] = generator.total_mine_number
+    bitmaps = file[bitmaps_offset:].reshape(num_boards, board_bytes)
+    for start in range(0, num_boards, chunk_size):
+        stop = min(start + chunk_size, num_boards)
+        mined = np.zeros((stop - start, num_squares), dtype=bool)
+        for row in mined:
+            row[generator.get_mines()] = True
+        bitmaps[start:stop] = np.packbits(mined, axis=1)
+    file.flush()
+    del file
+    return Corpus(filepath)
+
+class Corpus:
+    '''A corpus file, memory-mapped read-only. Boards are numbered from 0.
+    Pickling a Corpus (eg to send it to a worker process) only sends the
+    file path: the worker maps the file again'''
+    def __init__(self, filepath):
+        self.filepath = os.fspath(filepath)
+        self._load()
+
+    def _load(self):
+        self._file = np.memmap(self.filepath, dtype=np.uint8, mode='r')
+        magic, num_boards, seed = CORPUS_HEADER.unpack(
+            self._file[:CORPUS_HEADER.size].tobytes())
+        assert magic == FILE_MAGIC, f'{self.filepath} is not a corpus file'
+        self.seed = int.from_bytes(seed, 'little')
+        #zero-copy views of the file
+        self.index = self._file[CORPUS_HEADER.size : CORPUS_HEADER.size
+                                + num_boards * INDEX_DTYPE.itemsize
+                                ].view(INDEX_DTYPE)
+
+    def __getstate__(self):
+        return {'filepath' : self.filepath}
+
+    def __setstate__(self, state):
+        self.filepath = state['filepath']
+        self._load()
+
+    def __len__(self):
+        return len(self.index)
+
+    def board_size(self, i):
+        '''-> (grid_width, grid_height) of board i'''
+        entry = self.index[i]
+        return int(entry['grid_width']), int(entry['grid_height'])
+
+    def mine_bitmap(self, i):
+        '''-> the packed mine bitmap of board i: a read-only view of the
+        file, not a copy'''
+        grid_width, grid_height = self.board_size(i)
+        offset = int(self.index[i]['offset'])
+        return self._file[offset : offset + (grid_width * grid_height + 7) // 8]
+
+    def mine_mask(self, i):
+        '''-> bool np.ndarray over the flat grid, True for the mined squares
+        of board i (see MinesweeperEngine.load_board())'''
+        grid_width, grid_height = self.board_size(i)
+        return np.unpackbits(self.mine_bitmap(i),
+                             count=grid_width * grid_height).view(bool)
+
+    def load(self, i, game):
+        '''Start a new game on board i, on a MinesweeperEngine or a
+        MinesweeperGrid of the same size'''
+        assert (game.grid_width, game.grid_height) == self.board_size(i),\
+               f'Board {i} is a different size to the grid'
+        game.load_board(self.mine_mask(i))
+
+    def new_engine(self, i, **kwargs):
+        '''-> MinesweeperEngine, with a new game set up on board i.
+        kwargs are passed to MinesweeperEngine()'''
+        engine = MinesweeperEngine(*self.board_size(i), mine_density=None,
+                                   mine_locations=(), **kwargs)
+        engine.load_board(self.mine_mask(i))
+        return engine
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('filepath')
+    parser.add_argument('-n', '--boards', type=int, default=10000)
+    parser.add_argument('--width', type=int, default=30)
+    parser.add_argument('--height', type=int, default=16)
+    parser.add_argument('--mines', type=int, default=None,
+                        help='number of mines (overrides --density)')
+    parser.add_argument('--density', type=float, default=0.17)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    corpus = create_corpus(args.filepath, args.boards, args.width, args.height,
+                           args.mines, args.density, args.seed)
+    print(f'{len(corpus)} boards of {args.width}x{args.height} with '
+          f'{int(corpus.index[0]["mine_number"])} mines (seed {corpus.seed}) '
+          f'saved to {args.filepath}')
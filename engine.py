@@ -0,0 +1,728 @@
+import numpy as np
+
+#------------------------------- GRID UTILITIES --------------------------------
+
+def count_neighbours(mask):
+    '''For each cell, count how many of the cells adjacent to it (by a side or
+    a corner) are nonzero in `mask`. This is a convolution with a 3x3 kernel of
+    ones (minus the centre), with the grid padded by zeros.
+    A mask of small integers (< 32) is summed instead, so several counts can
+    be packed into different bits and done at once.
+    -> np.ndarray of uint8, same shape as mask'''
+    width, height = mask.shape
+    padded = np.zeros((width + 2, height + 2), dtype=np.uint8)
+    padded[1:-1, 1:-1] = mask
+    #the kernel is separable: sum along x, then along y
+    columns = padded[:-2] + padded[1:-1] + padded[2:]
+    counts = columns[:, :-2] + columns[:, 1:-1] + columns[:, 2:]
+    counts -= padded[1:-1, 1:-1]
+    return counts
+
+#Kinds of move, as kept in MinesweeperEngine.move_log (see also records.py)
+MOVE_OPEN, MOVE_OPEN_SPLASH, MOVE_CHORD, MOVE_FLAG, MOVE_UNFLAG = range(5)
+
+#------------------------------- MINE GENERATION -------------------------------
+
+class MineGenerator:
+    '''Chooses where the mines go. Mines are handled as flat indices into the
+    grid (x * grid_height + y), and the random ones are sampled by numpy, so
+    this is fast even for huge boards'''
+    def __init__(self, grid_width, grid_height, initial_seed=None):
+        '''initial_seed can be anything np.random.default_rng() accepts: an
+        int, a np.random.SeedSequence (eg spawned from a root seed), or None
+        for a fresh unpredictable stream. Each generator has its own stream,
+        so games don't affect each other'''
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.num_cells = grid_width * grid_height
+        self.rng = np.random.default_rng(initial_seed)
+
+    def use_settings(self, mine_locations=None, mine_number=None, mine_density=None):
+        '''
+        mine_locations - a list of squares that must be mined
+        mine_number    - the total number of mines
+        mine_density   - the proportion of squares that should be mined
+        Returns -> None
+        Notes:
+        1. All three arguments are optional but at least one must be specified.
+        2. If both mine_number and mine_density are given, mine_density is ignored.
+        3. If both mine_locations and mine_number are given, mine_number must be at
+        least len(mine_locations). Extra mines will be randomly placed. The same applies
+        for mine_density except mine number is calculated as
+        num = mine_density * (grid_width * grid_height).
+        4. If mine_locations is not given, mines will be randomly placed.
+        5. Call .get_mines() to retrieve generated mine locations.
+        '''
+        self.mine_locations = mine_locations
+        if self.mine_locations is None:
+            self.mine_locations = []
+        locations = np.array(self.mine_locations, dtype=np.intp).reshape(-1, 2)
+        assert np.all((0 <= locations[:, 0]) &
+                      (locations[:, 0] < self.grid_width))
+        assert np.all((0 <= locations[:, 1]) &
+                      (locations[:, 1] < self.grid_height))
+        self.preset_mines = np.unique(locations[:, 0] * self.grid_height
+                                      + locations[:, 1])
+
+        self.num_random_mines = 0
+        if mine_number is not None:
+            assert 0 <= mine_number <= self.num_cells
+            self.total_mine_number = mine_number
+            self.num_random_mines = self.total_mine_number
+        elif mine_density is not None:
+            assert 0.0 <= mine_density <= 1.0
+            self.total_mine_number = round(mine_density * self.num_cells)
+            self.num_random_mines = self.total_mine_number
+        if mine_locations is not None:
+            if self.num_random_mines:
+                self.num_random_mines -= len(self.preset_mines)
+            else:
+                self.total_mine_number = len(self.preset_mines)
+        assert self.num_random_mines >= 0, 'See note 3 in function docstring'
+
+    def get_mines(self, exclude=(), fallback_exclude=()):
+        '''-> sorted np.ndarray of the flat indices (x * grid_height + y) of
+        all the mines.
+        .use_settings(...) must be called first
+        If random generation is required, a new set of mines will be generated
+        every time this function is called. Random mines aren't put in the
+        squares in `exclude` (flat indices). If that doesn't leave room for
+        them, they are kept out of the squares in `fallback_exclude` instead
+        (eg just the square clicked, when `exclude` is its whole
+        neighbourhood), and only if that doesn't leave room either can they
+        go anywhere.'''
+        if self.num_random_mines == 0:
+            return self.preset_mines.copy()
+        for squares in (exclude, fallback_exclude, ()):
+            excluded = np.union1d(self.preset_mines,
+                                  np.asarray(squares, dtype=np.intp))
+            if self.num_cells - len(excluded) >= self.num_random_mines:
+                break
+        #choose which of the free squares (in order) get a mine
+        ranks = self.rng.choice(self.num_cells - len(excluded),
+                                self.num_random_mines, replace=False,
+                                shuffle=False)
+        ranks.sort()
+        #the k-th free square is square number k plus the number of excluded
+        # squares before it
+        free_before = excluded - np.arange(len(excluded))
+        mines = ranks + np.searchsorted(free_before, ranks, side='right')
+        return np.union1d(mines, self.preset_mines)
+
+#------------------------------ MINESWEEPER ENGINE -----------------------------
+
+class MinesweeperEngine:
+    '''The rules of minesweeper, without any display.
+    Doesn't import pygame, load images or fonts, or call back into an app, so
+    it can be used directly by solvers that play lots of games.
+    MinesweeperGrid (in minesweeper.pyw) is a graphical view over one of these:
+    it forwards moves to the engine, then updates the app's displays.'''
+
+    #What happens on the first click (see __init__)
+    FIRST_CLICK_POLICIES = ('relocate', 'safe', 'opening')
+
+    def __init__(self, grid_width, grid_height,
+                 mine_number=None, mine_density=0.17, mine_locations=None,
+                 seed=None, first_click='relocate', record_moves=False):
+        '''
+        width and height are in squares (aka tiles).
+        If `mine_locations` (list of 2-tuples of integer coords) is specified,
+        mines will be placed at these coordinates. Otherwise they will be
+        randomly generated based on either mine_density (proportion of tiles
+        with a mine) or mine_number. In this case `seed` (an int or a
+        np.random.SeedSequence) seeds this engine's random number generator,
+        so every game it generates is reproducible.
+        first_click decides how the first square opened is kept safe:
+          'relocate' - mines are placed when the game starts, and a mine under
+                       the first click is moved somewhere else
+          'safe'     - random mines are placed on the first click, anywhere
+                       except the square clicked
+          'opening'  - random mines are placed on the first click, away from
+                       the square clicked and its neighbours, so the first
+                       click opens an opening
+        Mines from mine_locations are placed along with the random ones: when
+        the game starts with 'relocate' (or when all the mines are given), and
+        on the first click otherwise. A given mine under the first click is
+        moved somewhere else, as with 'relocate'.
+        If record_moves is True, every move of the current game is kept in
+        .move_log, as (kind, flat index) pairs, where kind is one of the
+        MOVE_* constants. play_move() plays them again.
+        '''
+        self.grid_width = int(grid_width)
+        self.grid_height = int(grid_height)
+        assert self.grid_width > 0 and self.grid_height > 0,\
+               'Grid dimensions must be positive'
+        assert first_click in self.FIRST_CLICK_POLICIES,\
+               f'first_click should be one of {self.FIRST_CLICK_POLICIES}'
+        self.first_click = first_click
+        self.generator = MineGenerator(self.grid_width, self.grid_height,
+                                       initial_seed=seed)
+        self.generator.use_settings(mine_locations, mine_number, mine_density)
+
+        # Setup before .neighbours function can be used
+        self._saved_neighbours = {}
+        self._square_filter = \
+            lambda sq: not(sq[0] < 0 or sq[1] < 0 or
+                           sq[0] == self.grid_width or sq[1] == self.grid_height)
+
+        # The grid as the player sees it: -1 for unopened cells, -2 for
+        # flagged cells, and the cell's number for opened cells.
+        # Kept up to date as cells change, and reused for every new game, so
+        # a reference to the read-only view stays valid
+        self._view = np.full((self.grid_width, self.grid_height), -1,
+                             dtype=np.int8)
+        self._player_view = self._view.view()
+        self._player_view.flags.writeable = False
+        #the logical grid (see new_game) is also reused
+        self._grid = np.zeros((self.grid_width, self.grid_height),
+                              dtype=np.uint8)
+        #1D views of both grids, indexed by x * grid_height + y
+        self._flat_grid = self._grid.reshape(-1)
+        self._flat_view = self._view.reshape(-1)
+        #flat index offsets to a square's neighbours, as (dx, dy) pairs:
+        # dy = -1 for the first 3, 0 for the next 2 and +1 for the last 3
+        H = self.grid_height
+        self._neighbour_offsets = np.array([-H-1, -1, H-1, -H, H, -H+1, 1, H+1])
+        self.move_log = [] if record_moves else None
+
+        # Set up logical grid & gameplay variables
+        self.new_game()
+
+    def new_game(self, mine_locations=None, mine_number=None, mine_density=None):
+        # Mine generation settings
+        if (mine_number is not None
+            or mine_density is not None
+            or mine_locations is not None):
+            self.generator.use_settings(mine_locations,
+                                        mine_number,
+                                        mine_density)
+        self._reset()
+
+    def load_board(self, mines):
+        '''Start a new game on a given board, instead of generating one. The
+        mine generation settings are kept for later games.
+        mines - the flat indices (x * grid_height + y) of the mines, or a
+                boolean array over the flat grid, True for mined squares'''
+        self._reset(mines)
+
+    def _reset(self, mines=None):
+        '''Set up a new game, on the given mines if there are any'''
+        #For each entry in the grid, counting from least significant bit:
+        #bits 0-3: adjacent mine number (#mines in adj. squares, from 0-8)
+        #          should be zeroed for a mine
+        #bit 4: is square mined?
+        #bit 5: flagged?
+        #bit 6: opened?
+        self._grid.fill(0)
+        self._view.fill(-1)
+
+        # Mine generation (random mines may wait for the first click)
+        self.mine_number = self.generator.total_mine_number
+        self._mines_placed = False
+        if mines is not None:
+            self._place_mines(mines=mines)
+        elif (self.first_click == 'relocate'
+              or self.generator.num_random_mines == 0):
+            self._place_mines()
+        self.mine_counter = self.mine_number
+
+        # Gameplay
+        self.buttons_left = self.grid_width * self.grid_height
+        self.is_virgin = True #set to False when player makes first move
+        self.won = False
+        self.lost = False
+        self.lost_square = None #the mine that was opened, once game is lost
+        self.num_moves = 0 #moves made in this game, by anyone
+        #squares opened by the current move (see last_revealed):
+        # flat indices of single squares, and arrays of them from openings
+        self._revealed_squares = []
+        self._revealed_openings = []
+        if self.move_log is not None:
+            self.move_log = []
+
+    def _place_mines(self, exclude=(), mines=None, fallback_exclude=()):
+        '''Generate the mines (away from the flat indices in `exclude`, or
+        else `fallback_exclude`, if possible; see MineGenerator.get_mines()),
+        or use the given ones (see load_board), and work out the numbers.
+        Keeps any flags'''
+        mined = np.zeros(self.grid_width * self.grid_height, dtype=bool)
+        if mines is None:
+            mines = self.generator.get_mines(exclude, fallback_exclude)
+        mined[mines] = True
+        mined = mined.reshape(self.grid_width, self.grid_height)
+        self._grid[...] = (np.where(mined, np.uint8(16), count_neighbours(mined))
+                           | (self._grid & 0b100000))
+        self.mine_number = int(np.count_nonzero(mined))
+        self._mines_placed = True
+
+    @property
+    def mine_indices(self):
+        '''-> sorted np.ndarray of the flat indices (x * grid_height + y) of
+        the mines. Empty until the mines are placed (see first_click)'''
+        return np.flatnonzero(self._flat_grid & 0b10000)
+
+    @property
+    def mines(self):
+        '''-> list of (x, y) coords of the mines (see mine_indices)'''
+        xs, ys = self.flat_to_coords(self.mine_indices)
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    #****************** UTILITY FUNCTIONS FOR GAME MECHANICS *******************
+
+    def neighbours(self, x, y): #NB: Must return an iterable.
+        '''Returns an iterable of two-tuples representing
+        the squares adjacent to (x, y) by a side or a corner'''
+        if (x, y) in self._saved_neighbours:
+            return self._saved_neighbours[x, y]
+        else:
+            f = filter(self._square_filter, ((x-1,y-1),(x,y-1),
+                                             (x+1,y-1),(x-1,y),(x+1,y),
+                                             (x-1,y+1),(x,y+1),(x+1,y+1)))
+            self._saved_neighbours[x,y] = f = tuple(f)
+            return f
+
+    def _win(self):
+        self.won = True
+
+    def _lose(self, x, y): #x and y are coordinates of last mine clicked
+        self.lost = True
+        self.lost_square = (x, y)
+
+    def check_valid_coords(self, x, y):
+        is_valid = True
+        error = ''
+        if x % 1 or y % 1:
+            is_valid = False
+            error = 'coords should be integers'
+        elif (x < 0 or x >= self.grid_width or
+              y < 0 or y >= self.grid_height):
+            is_valid = False
+            error = f'invalid co-ordinates {x}, {y}'
+        return is_valid, error
+
+    def _check_valid_squares(self, xs, ys):
+        '''Check many co-ordinates at once, raising AssertionError (for the
+        first invalid one) like check_valid_coords()
+        -> np.ndarray of their flat indices (x * grid_height + y)'''
+        xs, ys = np.asarray(xs), np.asarray(ys)
+        assert xs.ndim == 1 and xs.shape == ys.shape,\
+               'xs and ys should be 1D, with the same length'
+        if xs.dtype.kind not in 'iu' or ys.dtype.kind not in 'iu':
+            if np.any(xs % 1) or np.any(ys % 1):
+                raise AssertionError('coords should be integers')
+        xs, ys = xs.astype(np.intp), ys.astype(np.intp)
+        invalid = ((xs < 0) | (xs >= self.grid_width)
+                   | (ys < 0) | (ys >= self.grid_height))
+        if np.any(invalid):
+            i = np.argmax(invalid)
+            raise AssertionError(f'invalid co-ordinates {xs[i]}, {ys[i]}')
+        return xs * self.grid_height + ys
+
+    def _update_view(self, x, y):
+        '''Copy the state of square (x, y) to the player's view of the grid.
+        Must be called whenever a square's bits change'''
+        code = self._grid[x, y]
+        if code & 0b1000000: #is opened
+            self._view[x, y] = code & 0b1111 #number
+        elif code & 0b100000: #is flagged
+            self._view[x, y] = -2
+        else:
+            self._view[x, y] = -1
+        #no cells should be opened and mined
+
+    def _open(self, x, y):
+        '''Opens a single square. No input sanitisation or first click protection'''
+        if not self._grid[x, y] & 0b1000000: #if not opened already
+            self._grid[x, y] |= 0b1000000 #set 'opened' bit
+            self._view[x, y] = self._grid[x, y] & 0b1111
+            self.buttons_left -= 1
+            self._revealed_squares.append(x * self.grid_height + y)
+
+    def _start_move(self, kind, x, y):
+        '''Forget the squares revealed by the last move, and log this one'''
+        self.num_moves += 1
+        if self.move_log is not None:
+            self.move_log.append((kind, x * self.grid_height + y))
+        self._revealed_squares = []
+        self._revealed_openings = []
+
+    @property
+    def last_revealed(self):
+        '''Squares opened by the last move (just the square that was clicked,
+        unless it started an opening or it was a chord).
+        -> np.ndarray of flat indices (x * grid_height + y); see
+           flat_to_coords()'''
+        return np.concatenate([np.array(self._revealed_squares, dtype=np.intp),
+                               *self._revealed_openings])
+
+    def flat_to_coords(self, flat_indices):
+        '''Convert flat indices (x * grid_height + y), like those in
+        .last_revealed, to coordinates.
+        -> xs, ys'''
+        return np.divmod(flat_indices, self.grid_height)
+
+    def _is_opened(self, x, y):
+        '''No input sanitisation'''
+        return self._grid[x, y] & 0b1000000 #'opened' bit
+
+    def _is_mine(self, x, y):
+        '''No input sanitisation'''
+        return self._grid[x, y] & 0b10000 #'mined' bit
+
+    def _get_number(self, x, y):
+        '''No input sanitisation; will return number even if square is unopened
+        If square is mined, will return -1'''
+        if self._is_mine(x, y):
+            return -1
+        else:
+            return int(self._grid[x, y] & 0b1111)
+
+    def _add_mine(self, x, y):
+        '''Put a mine at (x, y) if the square is still unopened
+           Returns True if successful, False if not'''
+        if self._grid[x, y] & 0b1010000: #if button removed or mined already
+            return False
+        else:
+            self._grid[x, y] |= 0b10000 #set 'mined' bit
+            self._grid[x, y] &= 0b1110000 #set number to 0
+            self.mine_number += 1
+            self.mine_counter += 1
+            #if the mine was added on the last unopened square, then you win
+            if self.buttons_left == self.mine_number:
+                self._win()
+            #update numbers of neighbours
+            for i, j in self.neighbours(x, y):
+                if not self._grid[i, j] & 0b10000: #if not mined
+                    self._grid[i, j] += 1 #increment number
+                    self._update_view(i, j)
+            self._update_view(x, y)
+            return True
+
+    def _remove_mine(self, x, y):
+        '''If there is a mine in square (x, y), get rid of it
+           If (x, y) is not a mine, return False
+           If operation successful, return True'''
+        if not self._grid[x, y] & 0b10000: #if not a mine return false
+            return False
+        else:
+            self._grid[x, y] &= 0b1100000 #clear 'mined' bit and set number to 0
+            self.mine_number -= 1
+            self.mine_counter -= 1
+            #calculate number and update numbers of neighbours
+            count = 0
+            for i,j in self.neighbours(x,y):
+                if not self._grid[i, j] & 0b10000: #if not mine
+                    self._grid[i, j] -= 1 #decrement number
+                    self._update_view(i, j)
+                else: #if mined
+                    count += 1
+            self._grid[x, y] += count
+            self._update_view(x, y)
+            return True
+
+    def _neighbour_indices(self, squares):
+        '''Flat indices of all the squares adjacent to the given squares
+        (flat indices), with repeats.
+        -> 1D np.ndarray'''
+        neighbours = squares[:, None] + self._neighbour_offsets
+        #off the left or right edge
+        valid = (neighbours >= 0) & (neighbours < len(self._flat_grid))
+        #off the top or bottom edge
+        ys = squares % self.grid_height
+        valid[:, :3] &= (ys > 0)[:, None]
+        valid[:, 5:] &= (ys < self.grid_height - 1)[:, None]
+        return neighbours[valid]
+
+    def _splash(self, x, y):
+        '''Should be called on an opened 'empty' square with no neighbouring
+        mines. Opens the whole opening: all the connected empty squares, and
+        the numbered squares around them (but not flagged squares).
+        Squares are opened in waves, each wave being every unopened
+        neighbour of the empty squares in the last wave, so every square is
+        only looked at a few times and the work is done by numpy.
+        -> np.ndarray of flat indices (x * grid_height + y) of the squares
+           opened, not including (x, y)'''
+        grid, view = self._flat_grid, self._flat_view
+        wave = np.array([x * self.grid_height + y], dtype=np.intp)
+        opened = []
+        while len(wave):
+            candidates = self._neighbour_indices(wave)
+            candidates = candidates[(grid[candidates] & 0b1100000) == 0]
+            new = np.unique(candidates) #not opened or flagged
+            grid[new] |= 0b1000000 #set 'opened' bits
+            view[new] = grid[new] & 0b1111
+            opened.append(new)
+            wave = new[(grid[new] & 0b11111) == 0] #empty squares
+        opened = np.concatenate(opened)
+        self.buttons_left -= len(opened)
+        self._revealed_openings.append(opened)
+        return opened
+
+    def _attempt_chord_with_splash(self, x, y):
+        '''Attempts to chord at square (x, y).
+        If an empty (number=0) square is opened, splash automatically applied.
+        Should only be called on an opened square (not checked)'''
+        self._start_move(MOVE_CHORD, x, y)
+        #find number of cells flagged around this cell
+        num_flags = 0
+        for i, j in self.neighbours(x, y):
+            if self._is_flagged(i, j):
+                num_flags += 1
+        #if num flagged neighbours == number in square,
+        # open all the unflagged neighbours
+        if self._get_number(x, y) == num_flags:
+            for i, j in self.neighbours(x, y):
+                if not self._is_flagged(i, j):
+                    self._open(i, j)
+                    num = self._get_number(i, j) #return -1 for mines
+                    if num == -1:
+                        self._lose(i, j)
+                        break
+                    elif num == 0:
+                        self._splash(i, j)
+        if self.buttons_left == self.mine_number:
+            self._win()
+
+    def _is_flagged(self, x, y):
+        '''No input sanitisation'''
+        return self._grid[x, y] & 0b0100000 #flagged bit
+        #if square is opened, flagged bit should be 0
+
+    def _set_flag(self, x, y):
+        '''No input sanitisation. Updates mine counter'''
+        self._start_move(MOVE_FLAG, x, y)
+        if not self._is_flagged(x, y):
+            self.mine_counter -= 1
+        self._grid[x, y] |= 0b0100000 #set 'flagged' bit
+        self._update_view(x, y)
+
+    def _clear_flag(self, x, y):
+        '''No input sanitisation. Updates mine counter'''
+        self._start_move(MOVE_UNFLAG, x, y)
+        if self._is_flagged(x, y):
+            self.mine_counter += 1
+        self._grid[x, y] &= 0b1011111 #clear 'flagged' bit
+        self._update_view(x, y)
+
+    def _toggle_flag(self, x, y):
+        '''No input sanitisation. Updates mine counter'''
+        if self._is_flagged(x, y):
+            self._clear_flag(x, y)
+        else:
+            self._set_flag(x, y)
+
+    #******************** API FUNCTIONS FOR PLAYING THE GAME *******************
+
+    def get_mine_counter(self):
+        '''Returns the total number of mines minus the number of flags'''
+        return self.mine_counter
+
+    def get_mine_number(self):
+        '''Returns the total number of mines in the grid'''
+        return self.mine_number
+
+    def is_opened(self, x, y):
+        '''Return whether this grid square has been opened
+        (ie number is visible, either because it has been clicked,
+        or it is part of a large opening)'''
+        valid, error = self.check_valid_coords(x, y)
+        if not valid:
+            raise AssertionError(error)
+        return self._is_opened(x, y)
+
+    def is_flagged(self, x, y):
+        '''Returns whether this grid square is flagged'''
+        valid, error = self.check_valid_coords(x, y)
+        if not valid:
+            raise AssertionError(error)
+        return self._is_flagged(x, y)
+
+    def set_flag(self, x, y):
+        '''Sets flag on square. Should only be called on an unopened square'''
+        valid, error = self.check_valid_coords(x, y)
+        if not valid:
+            raise AssertionError(error)
+        if self._is_opened(x, y):
+            raise AssertionError(f'square {x}, {y} is opened. Cannot set flag')
+        self._set_flag(x, y)
+
+    def clear_flag(self, x, y):
+        '''Clears flag from square. Should only be called on an unopened square'''
+        valid, error = self.check_valid_coords(x, y)
+        if not valid:
+            raise AssertionError(error)
+        if self._is_opened(x, y):
+            raise AssertionError(f'square {x}, {y} is opened. Cannot set/clear flag')
+        self._clear_flag(x, y)
+
+    def toggle_flag(self, x, y):
+        '''Toggles flag on square. Should only be called on an unopened square'''
+        valid, error = self.check_valid_coords(x, y)
+        if not valid:
+            raise AssertionError(error)
+        if self._is_opened(x, y):
+            raise AssertionError(f'square {x}, {y} is opened. Cannot toggle flag')
+        self._toggle_flag(x, y)
+
+    def get_number(self, x, y):
+        '''Return the number in the square (x, y).
+        Should only be called on an opened square'''
+        valid, error = self.check_valid_coords(x, y)
+        if not valid:
+            raise AssertionError(error)
+        if not self._is_opened(x, y):
+            raise AssertionError(f'square {x}, {y} is unopened. Cannot get number')
+        return self._get_number(x, y)
+
+    def open_square(self, x, y, do_splash=False):
+        '''Open an unopened square.
+        Afterwards, .last_revealed holds the squares that were opened.
+        -> 1 if you opened a mined square, else 0'''
+        valid, error = self.check_valid_coords(x, y)
+        if not valid:
+            raise AssertionError(error)
+        if self._is_opened(x, y):
+            raise AssertionError(f'square {x}, {y} is already opened')
+        if self._is_flagged(x, y):
+            raise AssertionError(f'flagged square {x}, {y} cannot be opened')
+
+        self._start_move(MOVE_OPEN_SPLASH if do_splash else MOVE_OPEN, x, y)
+        return self._open_square(x, y, do_splash)
+
+    def _open_square(self, x, y, do_splash):
+        '''The rules of opening a square, for open_square() and
+        open_squares(). No input sanitisation'''
+        if not self._mines_placed:
+            square = x * self.grid_height + y
+            if self.first_click == 'safe':
+                self._place_mines(exclude=[square])
+            else: #the square and its neighbours (or else just the square)
+                self._place_mines(exclude=np.append(
+                    self._neighbour_indices(np.array([square])), square),
+                    fallback_exclude=[square])
+        self._open(x, y)
+
+        lost = False
+        #if you clicked on a mine, you lose
+        if self._is_mine(x, y):
+            #BUT if this is the first click, the game will
+            # move the mine for you because it's nice :)
+            if (self.is_virgin and
+                self.mine_number < self.grid_width * self.grid_height):
+                self._remove_mine(x, y) #make not mine
+                #random new square for this mine, which isn't opened or mined
+                # (so it isn't (x, y))
+                free = np.flatnonzero((self._flat_grid & 0b1010000) == 0)
+                i, j = divmod(int(free[self.generator.rng.integers(len(free))]),
+                              self.grid_height)
+                self._add_mine(i, j)
+            else:
+                self._lose(x, y)
+                lost = True
+        #if number is 0, and splash enabled, clear the whole opening
+        if do_splash and self._get_number(x, y) == 0:
+            self._splash(x, y)
+        #if all unmined cells are opened, then you win
+        if self.buttons_left == self.mine_number:
+            self._win()
+        self.is_virgin = False
+
+        return 1 if lost else 0
+
+    def open_square_with_splash(self, x, y):
+        return self.open_square(x, y, do_splash=True)
+
+    def open_squares(self, xs, ys, do_splash=True):
+        '''Open many unopened squares in one call, in order, as if
+        open_square() was called on each of them (and each is logged as a
+        move), but with one check of all the co-ordinates. Squares opened by
+        an earlier square's opening are skipped, and it stops if the game
+        ends. Afterwards, .last_revealed holds every square that was opened.
+        xs, ys - sequences (or 1D np.ndarrays) of co-ordinates
+        -> number of squares that were opened as moves'''
+        squares = self._check_valid_squares(xs, ys)
+        codes = self._flat_grid[squares]
+        for bit, problem in ((0b1000000, 'is already opened'),
+                             (0b0100000, 'is flagged, and cannot be opened')):
+            if np.any(codes & bit):
+                x, y = self.flat_to_coords(squares[np.argmax(codes & bit)])
+                raise AssertionError(f'square {x}, {y} {problem}')
+
+        kind = MOVE_OPEN_SPLASH if do_splash else MOVE_OPEN
+        #the squares revealed by each move, in order
+        revealed = []
+        for square in squares.tolist():
+            if self.won or self.lost:
+                break
+            if self._flat_grid[square] & 0b1000000: #opened by an opening
+                continue
+            x, y = divmod(square, self.grid_height)
+            self._start_move(kind, x, y)
+            self._open_square(x, y, do_splash)
+            revealed.append(self.last_revealed)
+        self._revealed_squares = []
+        self._revealed_openings = revealed
+        return len(revealed)
+
+    def flag_squares(self, xs, ys):
+        '''Set flags on many unopened squares in one call, as if set_flag()
+        was called on each of them (and each is logged as a move), but with
+        one check of all the co-ordinates.
+        xs, ys - sequences (or 1D np.ndarrays) of co-ordinates
+        -> number of flags placed (not counting squares already flagged)'''
+        squares = self._check_valid_squares(xs, ys)
+        grid = self._flat_grid
+        opened = grid[squares] & 0b1000000
+        if np.any(opened):
+            x, y = self.flat_to_coords(squares[np.argmax(opened)])
+            raise AssertionError(f'square {x}, {y} is opened. Cannot set flag')
+
+        self.num_moves += len(squares)
+        if self.move_log is not None:
+            self.move_log.extend((MOVE_FLAG, square)
+                                 for square in squares.tolist())
+        self._revealed_squares = []
+        self._revealed_openings = []
+        new_flags = np.unique(squares[(grid[squares] & 0b0100000) == 0])
+        grid[new_flags] |= 0b0100000 #set 'flagged' bits
+        self._flat_view[new_flags] = -2
+        self.mine_counter -= len(new_flags)
+        return len(new_flags)
+
+    def play_move(self, kind, x, y):
+        '''Make a move of the given kind (one of the MOVE_* constants), as
+        logged in .move_log'''
+        if kind == MOVE_OPEN:
+            self.open_square(x, y)
+        elif kind == MOVE_OPEN_SPLASH:
+            self.open_square_with_splash(x, y)
+        elif kind == MOVE_CHORD:
+            if not self.is_opened(x, y):
+                raise AssertionError(f'square {x}, {y} is unopened. Cannot chord')
+            self._attempt_chord_with_splash(x, y)
+        elif kind == MOVE_FLAG:
+            self.set_flag(x, y)
+        elif kind == MOVE_UNFLAG:
+            self.clear_flag(x, y)
+        else:
+            raise AssertionError(f'unknown kind of move {kind}')
+
+    def get_grid(self, output_grid):
+        '''Copy the grid (as the player sees it) to output_grid.
+        Modifies output_grid in-place, placing -1 for unopened cells,
+        -2 for flagged cells, and the cell's number for opened cells.
+        output_grid should already have the correct dimensions.
+        Should only be used while game is in progress (not won or lost)'''
+        if isinstance(output_grid, np.ndarray):
+            output_grid[...] = self._view
+        else:
+            for i in range(self.grid_width):
+                output_grid[i][:] = self._view[i].tolist()
+
+    def get_player_view(self):
+        '''Returns the grid as the player sees it, in the same format as
+        get_grid(), without copying it.
+        -> read-only np.ndarray of int8, with shape (grid_width, grid_height)
+        The array is updated in place as moves are made (and when a new game
+        is started), so it only needs to be fetched once'''
+        return self._player_view
@@ -0,0 +1,49 @@
+import sys, os
+#import from the parent directory:
+sys.path.append('..')
+from minesweeper import *
+from records import read_records
+#restore sys.path
+sys.path.remove('..')
+#move down to parent directory so we can use images from \images\
+os.chdir('..')
+
+#Plays back the games in a log file made with records.py
+# (eg by `python batch.py --record games.rec`), one move every MOVE_DELAY ms
+RECORD_FILEPATH = 'games.rec'
+MOVE_DELAY = 100
+NEWGAME_DELAY = 1500
+
+pygame.init()
+pygame.font.init()
+window = pygame.display.set_mode((800, 500))
+
+records = read_records(RECORD_FILEPATH)
+record = next(records)
+settings = Settings(SETTINGS_FILEPATH)
+settings.grid_width = record.grid_width
+settings.grid_height = record.grid_height
+settings.grid_scale = 1
+app = MinesweeperApp(window, settings)
+
+def play_record(record):
+    app.new_game(record.mine_mask)
+    moves = record.iter_moves()
+    def next_move():
+        move = next(moves, None)
+        if move is not None:
+            app.minesweeper_grid.play_move(*move)
+            return
+        app.cancel_delayed_action('replay')
+        #the grid isn't resized, so only games of the same size are shown
+        for next_record in records:
+            if (next_record.grid_width, next_record.grid_height) == \
+               (record.grid_width, record.grid_height):
+                app.add_delayed_action('next game', NEWGAME_DELAY,
+                                       play_record, args=[next_record])
+                break
+    app.add_delayed_action('replay', MOVE_DELAY, next_move, repeat=True)
+
+app.add_delayed_action('start replay', 500, play_record, args=[record])
+app.run()
+pygame.quit()
@@ -4,11 +4,19 @@ class BasicUIElement:
     clickable = False
     hoverable = False
     draggable = False
+    #set whenever the element's appearance changes, so the app knows to
+    # redraw it. The app clears it after drawing
+    dirty = True
     
     def __init__(self, window, x, y, width, height):
         self.window = window
         self.rect = [x, y, width, height]
 
+    def get_draw_rect(self):
+        '''Returns the area of the window that draw() draws on
+        -> pygame.Rect'''
+        return pygame.Rect(self.rect)
+
     def get_pos(self):
         '''Returns pixel coordinates of top left corner in window
         -> (x, y)'''
@@ -16,7 +24,8 @@ class BasicUIElement:
     def set_pos(self, new_pos):
         '''Move the whole object.
         Anchors to top left corner'''
-        self.rect[0], self.rect[1] = new_poa
+        self.rect[0], self.rect[1] = new_pos
+        self.dirty = True
 
     def get_size(self):
         '''Returns width and height in pixels
@@ -31,6 +40,7 @@ class BasicUIElement:
     def set_size(self, new_size):
         '''Changes width and height (in pixels)'''
         self.rect[2], self.rect[3] = new_size
+        self.dirty = True
 
     @property
     def left(self):
@@ -131,12 +141,20 @@ class TextRect(BasicUIElement):
             self.get_text_size(), self.rect,
             self.horiz_pad, self.vert_pad
         )
+        self.dirty = True
+
+    def get_draw_rect(self):
+        '''The text can stick out of the rect if it is too long'''
+        return pygame.Rect(self.rect).union(
+            pygame.Rect(self.text_pos, self.get_text_size()))
 
     def hide(self):
         self.hidden = True
+        self.dirty = True
 
     def show(self):
         self.hidden = False
+        self.dirty = True
 
     def get_text_size(self):
         '''-> (w, h)'''
@@ -161,8 +179,10 @@ class TextRect(BasicUIElement):
         self._recalculate_text_pos()
 
     def set_text(self, new_text):
-        self.text_surf = self.font.render(new_text, True, self.text_colour)
-        self._recalculate_text_pos()
+        if new_text != self.text:
+            self.text = new_text
+            self.text_surf = self.font.render(new_text, True, self.text_colour)
+            self._recalculate_text_pos()
 
     def draw(self):
         if not self.hidden:
@@ -185,8 +205,7 @@ class Button(ClickableUIElement):
                  on_click_call=lambda:None):
         #User interaction
         ClickableUIElement.__init__(self, window, x, y, width, height)
-        self.is_being_clicked = False #automatically modified by app
-        self.is_being_hovered = False #not modified by app
+        self._is_being_hovered = False #not modified by app
         self.on_click_call = on_click_call
 
         #Colours
@@ -227,6 +246,32 @@ class Button(ClickableUIElement):
     def _recalculate_text_pos(self):
         '''Call this function whenever button pos/size/text is changed'''
         self.text_pos = self._calculate_text_pos(self.text_size, self.rect)
+        self.dirty = True
+
+    #the button is drawn differently in each of these states
+    @property
+    def is_being_clicked(self):
+        return self._is_being_clicked
+    @is_being_clicked.setter
+    def is_being_clicked(self, value):
+        if value != self._is_being_clicked:
+            self._is_being_clicked = value
+            self.dirty = True
+
+    @property
+    def is_being_hovered(self):
+        return self._is_being_hovered
+    @is_being_hovered.setter
+    def is_being_hovered(self, value):
+        if value != self._is_being_hovered:
+            self._is_being_hovered = value
+            self.dirty = True
+
+    def set_colour(self, colour):
+        '''Change the background colour (when not clicked or hovered)'''
+        if colour != self.colour:
+            self.colour = colour
+            self.dirty = True
 
     def set_pos(self, pos):
         '''Move the button'''
@@ -242,9 +287,11 @@ class Button(ClickableUIElement):
         '''When button is hidden it is not drawn and cannot be clicked.
         No effect if button is already hidden.'''
         self.hidden = True
+        self.dirty = True
     def show(self):
         '''Un-hide button. No effect if button is not hidden'''
         self.hidden = False
+        self.dirty = True
 
     def on_click(self, pos):
         '''Called by app when left mouse btn is clicked,
@@ -1,8 +1,10 @@
-import os, random
+import os
 #don't print pygame welcome message
 os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
 
+import heapq, itertools, time
 import pygame, pygame.font
+import numpy as np
 from pygame.locals import *
 from pygame.time import Clock
 from dataclasses import dataclass
@@ -33,21 +35,26 @@ SETTINGS_FILEPATH = 'settings.json'
 
 from gui import * #custom UI elements (buttons and text displays)
 
+from engine import * #game logic, without any display
+
 #------------------------------- MINESWEEPER APP -------------------------------
 
-@dataclass
+@dataclass(eq=False)
 class DelayedAction:
+    '''Handle of an action added with MinesweeperApp.add_delayed_action(),
+    which can be used to cancel it'''
     name : str
     repeat : bool
     delay_in_ms : int
     function : Callable
     args : list
+    due : float = 0.0 #time.perf_counter() when it should next run
+    cancelled : bool = False
 
-    def __post_init__(self):
-        self.delay_left = self.delay_in_ms
-
-    def reset(self):
-        self.__post_init__()
+    def cancel(self):
+        '''Stop the action from running (again). Cancelled actions stay in
+        the app's queue until they are due, and are dropped then'''
+        self.cancelled = True
 
 class MinesweeperApp:
     def __init__(self, window, settings,
@@ -72,17 +79,26 @@ class MinesweeperApp:
         self.initialised = False
 
         #Mechanism for delayed function calls:
-        #Adding to the below list results in the call function(*args)
-        # after the specified delay
-        #To cancel a repeating action, remove it from self.delayed_actions manually
-        # or by calling .cancel_delayed_action('name')
-        #Note delays are approximate as the updates are only done every frame
+        #.add_delayed_action() results in the call function(*args) after the
+        # specified delay, and returns a handle which can be used to cancel it
+        # (or it can be cancelled by name with .cancel_delayed_action('name'))
+        #Delays are measured with time.perf_counter(), not by adding up frame
+        # times, but actions only run in update(), so at most once a frame
+        #Heap of (due time, order added, DelayedAction)
         self.delayed_actions = []
+        self._delayed_action_order = itertools.count()
+        #name: list of DelayedAction with that name, oldest first
+        self._named_actions = dict()
         #need to initialise the above first as it is used by
         # MinesweeperGrid.__init__ below
         
         #Also allow key binding
         self.bound_keys = dict()
+        #+ and - zoom the grid in and out
+        for key in (K_EQUALS, K_PLUS, K_KP_PLUS):
+            self.bind_key(key, False, False, False, self.zoom, [1])
+        for key in (K_MINUS, K_KP_MINUS):
+            self.bind_key(key, False, False, False, self.zoom, [-1])
 
         # Initialise app's gui objects
         PAD = int(4 * settings.ui_scale)
@@ -93,6 +109,8 @@ class MinesweeperApp:
             mine_density = settings.mine_density,
             mine_number = settings.mine_number,
             mine_locations = settings.mine_locations,
+            first_click = settings.first_click,
+            seed = settings.seed,
             scale = settings.grid_scale,
             allow_gui = not self.block_gui
         )
@@ -152,10 +170,15 @@ class MinesweeperApp:
         self.timer_running = False
         #boolean used for flashing the 'WIN' message
         self.flash_on = True
+        self.endgame_flash = None #its DelayedAction
         #used for dragging. references object being clicked, until it's released
         self.held_obj = None
         #used for keeping track of which object mouse is hovering over
         self.hover_obj = None
+        #Rendering: only the parts of the window that have changed are drawn
+        # (see draw()), unless the whole window needs to be redrawn
+        self.redraw_all = True
+        self._drawn_rects = {} #gui object -> area it covered when last drawn
 
         #Callback functions used by AI players
         self.lose_callback = lambda: None
@@ -192,21 +215,81 @@ class MinesweeperApp:
         self.minesweeper_grid.set_pos(((win_w - grid_w) // 2, grid_y))
         return (win_w, win_h)
 
-    def cancel_delayed_action(self, action_name):
-        '''Cancels a delayed action by name
-        If name is not unique (it should be!), first instance will be cancelled'''
-        success = False
-        for action in self.delayed_actions:
-            if action.name == action_name:
-                self.delayed_actions.remove(action)
-                success = True
-                break
-        return success
+    #grid scales that can be chosen with zoom()
+    ZOOM_LEVELS = (0.25, 0.5, 0.75, 1, 1.5, 2, 3, 4)
+
+    def set_grid_scale(self, scale):
+        '''Zoom the grid, and resize the window to fit'''
+        self.minesweeper_grid.set_scale(scale)
+        win_size = self.evaluate_layout()
+        pygame.display.set_mode(win_size)
+        self.redraw_all = True
+
+    def zoom(self, steps):
+        '''Zoom the grid in (steps > 0) or out (steps < 0) by a number of
+        ZOOM_LEVELS, starting from the level nearest to the current scale'''
+        scale = self.minesweeper_grid.scale
+        level = min(range(len(self.ZOOM_LEVELS)),
+                    key=lambda i: abs(self.ZOOM_LEVELS[i] - scale))
+        level = max(0, min(len(self.ZOOM_LEVELS) - 1, level + steps))
+        if self.ZOOM_LEVELS[level] != scale:
+            self.set_grid_scale(self.ZOOM_LEVELS[level])
+
+    def cancel_delayed_action(self, action):
+        '''Cancels a delayed action, given its handle (see
+        add_delayed_action()) or its name
+        If name is not unique (it should be!), first instance will be cancelled
+        -> whether an action was cancelled'''
+        if isinstance(action, DelayedAction):
+            success = not action.cancelled
+            action.cancel()
+            return success
+        for named_action in self._named_actions.get(action, ()):
+            if not named_action.cancelled:
+                named_action.cancel()
+                return True
+        return False
 
     def add_delayed_action(self, action_name, delay_ms, function,
                            repeat=False, args=[]):
-        self.delayed_actions.append(
-            DelayedAction(action_name, repeat, delay_ms, function, args))
+        '''Call function(*args) in delay_ms milliseconds (at the first
+        update() after that), and every delay_ms after that if repeat is set
+        -> DelayedAction, a handle to cancel it with'''
+        action = DelayedAction(action_name, repeat, delay_ms, function, args)
+        self._named_actions.setdefault(action_name, []).append(action)
+        self._schedule(action, time.perf_counter() + delay_ms / 1000)
+        return action
+
+    def _schedule(self, action, due):
+        action.due = due
+        heapq.heappush(self.delayed_actions,
+                       (due, next(self._delayed_action_order), action))
+
+    def _forget_action(self, action):
+        named_actions = self._named_actions[action.name]
+        named_actions.remove(action)
+        if not named_actions:
+            del self._named_actions[action.name]
+
+    def run_delayed_actions(self):
+        '''Run the delayed actions which are due. Actions added or
+        rescheduled while doing this are left for the next call, so a
+        repeating action with no delay runs once a frame'''
+        now = time.perf_counter()
+        due_actions = []
+        while self.delayed_actions and self.delayed_actions[0][0] <= now:
+            due_actions.append(heapq.heappop(self.delayed_actions)[2])
+        for action in due_actions:
+            #(it can be cancelled by an action that ran before it)
+            if not action.cancelled:
+                action.function(*action.args)
+            if action.repeat and not action.cancelled:
+                #keep to the original schedule, unless it has fallen behind
+                self._schedule(action,
+                               max(action.due + action.delay_in_ms / 1000,
+                                   now))
+            else:
+                self._forget_action(action)
 
     def set_win_callback(self, function):
         '''`function` will be executed whenever the game is lost.
@@ -244,40 +327,46 @@ class MinesweeperApp:
         if self.initialised:
             self.mine_counter.set_text('{:0>3d}'.format(num_mines))
 
-    def new_game(self):
+    def new_game(self, mines=None):
+        '''Start a new game, on the given board if `mines` is not None
+        (see MinesweeperEngine.load_board())'''
         self.reset_timer()
-        self.minesweeper_grid.new_game()
-        self.cancel_delayed_action('flash-win')
-        self.cancel_delayed_action('flash-lose')
+        if mines is None:
+            self.minesweeper_grid.new_game()
+        else:
+            self.minesweeper_grid.load_board(mines)
+        if self.endgame_flash is not None:
+            self.endgame_flash.cancel()
+            self.endgame_flash = None
         self.mine_counter.set_text('000')
         self.flash_on = True
-        self.newgame_btn.colour = self.settings.button_background_col
+        self.newgame_btn.set_colour(self.settings.button_background_col)
 
     def _flash_endgame(self, win:bool):
         if self.flash_on:
             if win:
                 self.mine_counter.set_text('000')
-            self.newgame_btn.colour = self.settings.button_background_col
+            self.newgame_btn.set_colour(self.settings.button_background_col)
             self.flash_on = False
         else:
             if win:
                 self.mine_counter.set_text('WIN')
-            self.newgame_btn.colour = self.settings.button_flash_col
+            self.newgame_btn.set_colour(self.settings.button_flash_col)
             self.flash_on = True
 
     def win(self):
         self.stop_timer()
         self.mine_counter.set_text('WIN')
-        self.newgame_btn.colour = self.settings.button_flash_col
-        self.add_delayed_action(
+        self.newgame_btn.set_colour(self.settings.button_flash_col)
+        self.endgame_flash = self.add_delayed_action(
             'flash-win', 700, self._flash_endgame, args=[True], repeat=True
         )
         self.win_callback()
 
     def lose(self):
         self.stop_timer()
-        self.newgame_btn.colour = self.settings.button_flash_col
-        self.add_delayed_action(
+        self.newgame_btn.set_colour(self.settings.button_flash_col)
+        self.endgame_flash = self.add_delayed_action(
             'flash-lose', 700, self._flash_endgame, args=[False], repeat=True
         )
         self.lose_callback()
@@ -365,25 +454,51 @@ class MinesweeperApp:
         if self.timer_running:
             self.time += time_passed_ms
             self.timer_display.set_text(self.time_to_text(self.time))
-        old_delayed_actions = self.delayed_actions.copy()
-        spent_delayed_actions = []
-        for delayed_action in old_delayed_actions:
-            delayed_action.delay_left -= time_passed_ms
-            if delayed_action.delay_left <= 0:
-                delayed_action.function(*delayed_action.args)
-                if delayed_action.repeat:
-                    delayed_action.reset()
-                else:
-                    spent_delayed_actions.append(delayed_action.name)
-        for name in spent_delayed_actions:
-            self.cancel_delayed_action(name)
+        self.run_delayed_actions()
         
         return self.quit_
 
     def draw(self):
-        self.window.fill(self.settings.background_col)
-        for obj in self.gui_objects:
-            obj.draw()
+        '''Redraw the parts of the window that have changed since the last
+        call (or all of it, if self.redraw_all is set).
+        -> list of pygame.Rect areas that were drawn on, for
+           pygame.display.update(). Empty if nothing has changed'''
+        grid = self.minesweeper_grid
+        if self.redraw_all:
+            self.redraw_all = False
+            self.window.fill(self.settings.background_col)
+            for obj in self.gui_objects:
+                if obj is grid:
+                    grid.draw(redraw_all=True)
+                else:
+                    obj.draw()
+                    obj.dirty = False
+                    self._drawn_rects[obj] = obj.get_draw_rect()
+            return [self.window.get_rect()]
+
+        #Each changed object is redrawn, along with the background and
+        # any objects overlapping it. The old area is redrawn as well, in
+        # case the object has shrunk or moved.
+        #The grid keeps track of its own squares, and doesn't overlap anything
+        dirty_objs = [obj for obj in self.gui_objects
+                      if obj is not grid and obj.dirty]
+        dirty_rects = []
+        for obj in dirty_objs:
+            rect = obj.get_draw_rect()
+            if obj in self._drawn_rects:
+                rect.union_ip(self._drawn_rects[obj])
+            self._drawn_rects[obj] = obj.get_draw_rect()
+            obj.dirty = False
+            dirty_rects.append(rect)
+        for rect in dirty_rects:
+            self.window.set_clip(rect)
+            self.window.fill(self.settings.background_col)
+            for obj in self.gui_objects:
+                if obj is not grid and rect.colliderect(self._drawn_rects[obj]):
+                    obj.draw()
+        self.window.set_clip(None)
+        dirty_rects.extend(grid.draw())
+        return dirty_rects
 
     def run(self):
         clock = Clock()
@@ -416,13 +531,18 @@ class MinesweeperApp:
                 elif event.type == MOUSEBUTTONUP:
                     self.on_mouseup(event.button, event.pos)
 
+                #the window's contents were lost (eg it was uncovered)
+                elif event.type == VIDEOEXPOSE:
+                    self.redraw_all = True
+
             #update
             if (not go) or self.update(clock.get_time()):
                 break
 
-            #render
-            self.draw()
-            pygame.display.update()
+            #render (only if something has changed)
+            dirty_rects = self.draw()
+            if dirty_rects:
+                pygame.display.update(dirty_rects)
 
             #wait for next frame
             clock.tick(self.settings.max_framerate)
@@ -432,76 +552,10 @@ class MinesweeperApp:
 
 #------------------------------- MINESWEEPER GRID ------------------------------
 
-class MineGenerator:
-    def __init__(self, grid_width, grid_height, initial_seed=None):
-        self.grid_width = grid_width
-        self.grid_height = grid_height
-        self.num_cells = grid_width * grid_height
-        if initial_seed is not None:
-            random.seed(seed)
-
-    def use_settings(self, mine_locations=None, mine_number=None, mine_density=None):
-        '''
-        mine_locations - a list of squares that must be mined
-        mine_number    - the total number of mines
-        mine_density   - the proportion of squares that should be mined
-        Returns -> None
-        Notes:
-        1. All three arguments are optional but at least one must be specified.
-        2. If both mine_number and mine_density are given, mine_density is ignored.
-        3. If both mine_locations and mine_number are given, mine_number must be at
-        least len(mine_locations). Extra mines will be randomly placed. The same applies
-        for mine_density except mine number is calculated as
-        num = mine_density * (grid_width * grid_height).
-        4. If mine_locations is not given, mines will be randomly placed.
-        5. Call .get_mines() to retrieve generated mine locations.
-        '''
-
-        self.mine_locations = mine_locations
-        if self.mine_locations is None:
-            self.mine_locations = []
-
-        self.num_random_mines = 0
-        if mine_number is not None:
-            assert 0 <= mine_number <= self.num_cells
-            self.total_mine_number = mine_number
-            self.num_random_mines = self.total_mine_number
-        elif mine_density is not None:
-            assert 0.0 <= mine_density <= 1.0
-            self.total_mine_number = round(mine_density * self.num_cells)
-            self.num_random_mines = self.total_mine_number
-        if mine_locations is not None:
-            for mine_loc in mine_locations:
-                assert 0 <= mine_loc[0] < self.grid_width
-                assert 0 <= mine_loc[1] < self.grid_height
-                mine_loc = tuple(mine_loc)
-            if self.num_random_mines:
-                self.num_random_mines -= len(mine_locations)
-            else:
-                self.total_mine_number = len(mine_locations)
-        assert self.num_random_mines >= 0, 'See note 3 in function docstring'
-
-        if self.num_random_mines > 0:
-            #get list of potential mine locations
-            self.potential_mines = []
-            for i in range(self.grid_width):
-                for j in range(self.grid_height):
-                    if (i, j) not in self.mine_locations:
-                        self.potential_mines.append((i, j))
-
-    def get_mines(self):
-        '''-> list of 2-tuples representing co-ordinates of all mines.
-        .use_settings(...) must be called first
-        If random generation is required, a new set of mines will be generated
-        every time this function is called.'''
-        mines = self.mine_locations.copy()
-        if self.num_random_mines > 0:
-            #take a random sample and add to mine locations
-            mines.extend(random.sample(self.potential_mines,
-                                       self.num_random_mines))
-        return mines
-
 class MinesweeperGrid:
+    '''Graphical view over a MinesweeperEngine, which holds the game logic.
+    Moves made through this class (by the mouse or by an AI player) are
+    forwarded to the engine, then the app's displays are updated to match'''
     # if True, will raise exceptions on invalid mines list passes to
     #  __init__ or reset
     # Use for debugging purposes
@@ -509,17 +563,30 @@ class MinesweeperGrid:
     
     IMG_SIZE = 16 #images are squares with side length of IMG_SIZE
 
+    #Each square is drawn with one of these tiles, which are kept side by
+    # side in one image (the atlas) in this order.
+    #Tiles 0-8 are the opened numbers
+    TILE_FILES = ('clear.png', '1.png', '2.png', '3.png', '4.png',
+                  '5.png', '6.png', '7.png', '8.png',
+                  'btn.png', 'flagged.png', 'redbomb.png', 'xbomb.png')
+    TILE_BUTTON = 9
+    TILE_FLAGGED = 10
+    TILE_MINE = 11       #shown for every mine when the game is lost
+    TILE_WRONG_FLAG = 12 #flag on a square with no mine, when the game is lost
+
     def __init__(self, app, window, pos_x, pos_y, grid_width, grid_height,
                  mine_number=None, mine_density=0.17, mine_locations=None,
-                 seed=None, scale=2, allow_gui=True):
+                 seed=None, first_click='relocate', record_moves=False,
+                 scale=2, allow_gui=True):
         '''
         width and height are in squares (aka tiles),
         the 16x16px tiles are scaled by `scale` (useful for HDPI displays).
         If `mine_locations` (list of 2-tuples of integer coords) is specified,
         mines will be placed at these coordinates. Otherwise they will be
         randomly generated based on either mine_density (proportion of tiles
-        with a mine) or mine_number. In this case `seed` is passed to random.seed()
-        if it is not None.
+        with a mine) or mine_number. In this case `seed` seeds the engine's
+        random number generator (see MinesweeperEngine).
+        See MinesweeperEngine for `first_click` and `record_moves`.
         '''
         # GUI Interaction through the App class
         self.app = app
@@ -533,32 +600,26 @@ class MinesweeperGrid:
         # if the player is an AI using the API functions
         self.allow_gui = allow_gui
 
-        # Other parameters
-        self.grid_width = int(grid_width)
-        self.grid_height = int(grid_height)
-        assert self.grid_width > 0 and self.grid_height > 0,\
-               'Grid dimensions must be positive'
-        self.generator = MineGenerator(self.grid_width, self.grid_height,
-                                       initial_seed=seed)
-        self.generator.use_settings(mine_locations, mine_number, mine_density)
-
-        # Setup before .neighbours function can be used
-        self._saved_neighbours = {}
-        self._square_filter = \
-            lambda sq: not(sq[0] < 0 or sq[1] < 0 or
-                           sq[0] == self.grid_width or sq[1] == self.grid_height)
+        # Game logic
+        self.engine = MinesweeperEngine(grid_width, grid_height,
+                                        mine_number=mine_number,
+                                        mine_density=mine_density,
+                                        mine_locations=mine_locations,
+                                        seed=seed, first_click=first_click,
+                                        record_moves=record_moves)
+        self.grid_width = self.engine.grid_width
+        self.grid_height = self.engine.grid_height
 
         # Set up visual grid
-        self.scale = scale
-        self.SQUARE = round(self.IMG_SIZE * scale + .5) #size of square in px (round up)
-        px_width = self.SQUARE * self.grid_width    #height in px on screen
-        px_height = self.SQUARE * self.grid_height  #width  of actual game
-        self.rect = [pos_x, pos_y, px_width, px_height]
-        # load images as Surface objects
+        self.rect = [pos_x, pos_y, 0, 0]
+        # load the tile images into an atlas
         self._load_images()
+        #sets the size of the squares, and creates the board surface
+        self.set_scale(scale)
 
-        # Set up logical grid & gameplay variables
-        self.new_game()
+        # State that has been reported to the app (the engine was already
+        # set up for a new game when it was created)
+        self._reset_app_state()
 
         #MinesweeperGrid initialised before the mine counter display
         #So add a delayed action with zero delay - this will be run next time
@@ -569,379 +630,211 @@ class MinesweeperGrid:
         )
 
     def _load_images(self):
-        size = (self.SQUARE, self.SQUARE)
-        scale = pygame.transform.scale
-        load = pygame.image.load
+        '''Load all the tiles into one surface, at their original size'''
         img_path = self.app.settings.image_path
-        mkpath = lambda fname: os.path.join(img_path, fname)
-        clear = scale(load(mkpath('clear.png')), size)
-        _1    = scale(load(mkpath('1.png')), size)
-        _2    = scale(load(mkpath('2.png')), size)
-        _3    = scale(load(mkpath('3.png')), size)
-        _4    = scale(load(mkpath('4.png')), size)
-        _5    = scale(load(mkpath('5.png')), size)
-        _6    = scale(load(mkpath('6.png')), size)
-        _7    = scale(load(mkpath('7.png')), size)
-        _8    = scale(load(mkpath('8.png')), size)
-        bomb  = scale(load(mkpath('bomb.png')), size)
-        self.imgs = (clear, _1, _2, _3, _4, _5, _6, _7, _8,
-                     *(None for i in range(7)), bomb)
-        #index into imgs list will give image for that number
-        self.xbomb_img   = scale(load(mkpath('xbomb.png')), size)
-        self.redbomb_img = scale(load(mkpath('redbomb.png')), size)
-        self.flagged_img = scale(load(mkpath('flagged.png')), size)
-        self.btn_img     = scale(load(mkpath('btn.png')), size)
+        S = self.IMG_SIZE
+        self._atlas_original = pygame.Surface((S * len(self.TILE_FILES), S))
+        #anything transparent in the images is drawn over the background
+        self._atlas_original.fill(self.app.settings.background_col)
+        for i, fname in enumerate(self.TILE_FILES):
+            img = pygame.image.load(os.path.join(img_path, fname))
+            self._atlas_original.blit(img, (S * i, 0))
+        self._atlases = {} #size of square in px -> atlas scaled to that size
+
+    def set_scale(self, scale):
+        '''Set the zoom level: the 16x16px tiles are drawn `scale` times as
+        big. Only the atlas is rescaled (once for each size), and the board
+        is redrawn next time draw() is called.
+        The app's layout needs to be re-evaluated afterwards'''
+        self.scale = scale
+        self.SQUARE = S = round(self.IMG_SIZE * scale + .5) #size of square in px (round up)
+        self.rect[2] = S * self.grid_width  #width in px on screen
+        self.rect[3] = S * self.grid_height #height of actual game
+        if S not in self._atlases:
+            self._atlases[S] = pygame.transform.scale(
+                self._atlas_original, (S * len(self.TILE_FILES), S)).convert()
+        self.atlas = self._atlases[S]
+        self._tile_areas = [pygame.Rect(S * i, 0, S, S)
+                            for i in range(len(self.TILE_FILES))]
+        #every square is drawn here, and the window is updated from it
+        self.board_surface = pygame.Surface(self.rect[2:]).convert()
+        self.mark_all_dirty()
 
     def new_game(self, mine_locations=None, mine_number=None, mine_density=None):
-        # Mine generation settings
-        if (mine_number is not None
-            or mine_density is not None
-            or mine_locations is not None):
-            self.generator.use_settings(mine_locations,
-                                        mine_number,
-                                        mine_density)
-
-        # Mine generation
-        self.mines = self.generator.get_mines()
-        self.mine_number = len(self.mines)
-        self._update_mine_counter(self.mine_number)
-
-        #For each entry in the grid, counting from least significant bit:
-        #bits 0-3: adjacent mine number (#mines in adj. squares, from 0-8)
-        #          should be zeroed for a mine
-        #bit 4: is square mined?
-        #bit 5: flagged?
-        #bit 6: opened?
-        self._grid = [[0 for j in range(self.grid_height)]
-                      for i in range(self.grid_width)]
-        for mined_square in self.mines:
-            #set the flag for a mine
-            self._grid[mined_square[0]][mined_square[1]] = 16
-            #add to the counts of neighbouring unmined squares
-            for i, j in self.neighbours(*mined_square):
-                if (i, j) not in self.mines:
-                    self._grid[i][j] += 1
-        
-        # Gameplay
-        self.buttons_left = self.grid_width * self.grid_height
-        self.is_virgin = True #set to False when player makes first move
-        self.won = False
-        self.lost = False
-
-    #****************** UTILITY FUNCTIONS FOR GAME MECHANICS *******************
-
-    def neighbours(self, x, y): #NB: Must return an iterable.
-        '''Returns an iterable of two-tuples representing
-        the squares adjacent to (x, y) by a side or a corner'''
-        if (x, y) in self._saved_neighbours:
-            return self._saved_neighbours[x, y]
-        else:
-            f = filter(self._square_filter, ((x-1,y-1),(x,y-1),
-                                             (x+1,y-1),(x-1,y),(x+1,y),
-                                             (x-1,y+1),(x,y+1),(x+1,y+1)))
-            self._saved_neighbours[x,y] = f = tuple(f)
-            return f
-
-    def _win(self):
-        self.won = True
-        self.app.win()
-
-    def _lose(self, x, y): #x and y are coordinates of last mine clicked
-        self.lost = True
-        self.app.lose()
+        self.engine.new_game(mine_locations, mine_number, mine_density)
+        self._reset_app_state()
+        self.mark_all_dirty()
+        self.app.update_mine_counter(self.mine_counter)
+
+    def load_board(self, mines):
+        '''Start a new game on the given mines.
+        See MinesweeperEngine.load_board()'''
+        self.engine.load_board(mines)
+        self._reset_app_state()
+        self.mark_all_dirty()
+        self.app.update_mine_counter(self.mine_counter)
+
+    #*********************** KEEPING THE APP UP TO DATE ************************
+
+    def _reset_app_state(self):
+        self._shown_mine_counter = self.engine.mine_counter
+        self._timer_started = False
+        self._game_over_reported = False
+
+    def _after_move(self, squares=()):
+        '''Report any changes in the engine's state back to the app, and
+        mark the squares the move changed to be drawn (the squares it
+        revealed, and `squares`: flat indices of the squares it flagged or
+        unflagged). Should be called after every move made through this grid'''
+        engine = self.engine
+        self._dirty.append(engine.last_revealed)
+        if len(squares):
+            self._dirty.append(np.asarray(squares, dtype=np.intp))
+        if engine.mine_counter != self._shown_mine_counter:
+            self._shown_mine_counter = engine.mine_counter
+            self.app.update_mine_counter(engine.mine_counter)
+        #if this was the player's first move, start the timer
+        if not (engine.is_virgin or self._timer_started):
+            self._timer_started = True
+            self.app.reset_timer() #sanity check the timer to zero
+            self.app.start_timer()
+        if not self._game_over_reported:
+            if engine.lost:
+                self._game_over_reported = True
+                self.mark_all_dirty() #the mines are shown
+                self.app.lose()
+            elif engine.won:
+                self._game_over_reported = True
+                self.app.win()
+
+    @property
+    def won(self):
+        return self.engine.won
+
+    @property
+    def lost(self):
+        return self.engine.lost
+
+    @property
+    def mines(self):
+        return self.engine.mines
+
+    @property
+    def mine_number(self):
+        return self.engine.mine_number
+
+    @property
+    def mine_counter(self):
+        return self.engine.mine_counter
+
+    @property
+    def num_moves(self):
+        return self.engine.num_moves
+
+    @property
+    def last_revealed(self):
+        '''Squares opened by the last move, as flat indices.
+        See MinesweeperEngine.last_revealed'''
+        return self.engine.last_revealed
+
+    def flat_to_coords(self, flat_indices):
+        '''See MinesweeperEngine.flat_to_coords()'''
+        return self.engine.flat_to_coords(flat_indices)
+
+    def neighbours(self, x, y):
+        '''See MinesweeperEngine.neighbours()'''
+        return self.engine.neighbours(x, y)
 
     def check_valid_coords(self, x, y):
-        is_valid = True
-        error = ''
-        if x % 1 or y % 1:
-            is_valid = False
-            error = 'coords should be integers'
-        elif (x < 0 or x >= self.grid_width or
-              y < 0 or y >= self.grid_height):
-            is_valid = False
-            error = f'invalid co-ordinates {x}, {y}'
-        return is_valid, error
-
-    def _update_mine_counter(self, new_mine_counter):
-        '''Should always be used when changing the mine counter,
-        as it also calls back to the app to update the display'''
-        self.mine_counter = new_mine_counter
-        self.app.update_mine_counter(new_mine_counter)
-
-    def _increment_mine_counter(self):
-        self._update_mine_counter(self.mine_counter + 1)
-
-    def _decrement_mine_counter(self):
-        self._update_mine_counter(self.mine_counter - 1)
-
-    def _open(self, x, y):
-        '''Opens a single square. No input sanitisation or first click protection'''
-        if not self._grid[x][y] & 0b1000000: #if not opened already
-            self._grid[x][y] |= 0b1000000 #set 'opened' bit
-            self.buttons_left -= 1
-
-    def _is_opened(self, x, y):
-        '''No input sanitisation'''
-        return self._grid[x][y] & 0b1000000 #'opened' bit
-
-    def _is_mine(self, x, y):
-        '''No input sanitisation'''
-        return self._grid[x][y] & 0b10000 #'mined' bit
-
-    def _get_number(self, x, y):
-        '''No input sanitisation; will return number even if square is unopened
-        If square is mined, will return -1'''
-        if self._is_mine(x, y):
-            return -1
-        else:
-            return self._grid[x][y] & 0b1111
-
-    def _add_mine(self, x, y):
-        '''Put a mine at (x, y) if the square is still unopened
-           Returns True if successful, False if not'''
-        if self._grid[x][y] & 0b1010000: #if button removed or mined already
-            return False
-        else:
-            self._grid[x][y] |= 0b10000 #set 'mined' bit
-            self._grid[x][y] &= 0b1110000 #set number to 0
-            self.mines.append((x, y))
-            self.mine_number += 1
-            self._increment_mine_counter()
-            #if the mine was added on the last unopened square, then you win
-            if self.buttons_left == self.mine_number:
-                self._win() 
-            #update numbers of neighbours
-            for i, j in self.neighbours(x, y):
-                if not self._grid[i][j] & 0b10000: #if not mined
-                    self._grid[i][j] += 1 #increment number
-            return True
-
-    def _remove_mine(self, x, y):
-        '''If there is a mine in square (x, y), get rid of it
-           If (x, y) is not a mine, return False
-           If operation successful, return True'''
-        if not self._grid[x][y] & 0b10000: #if not a mine return false
-            return False
-        else:
-            self._grid[x][y] &= 0b1100000 #clear 'mined' bit and set number to 0
-            self.mines.remove((x, y))
-            self.mine_number -= 1
-            self._decrement_mine_counter()
-            #calculate number and update numbers of neighbours
-            count = 0
-            for i,j in self.neighbours(x,y):
-                if not self._grid[i][j] & 0b10000: #if not mine
-                    self._grid[i][j] -= 1 #decrement number
-                else: #if mined
-                    count += 1
-            self._grid[x][y] += count
-            return True
-
-    def _splash(self, x, y):
-        '''Should be called on an 'empty' square with no neighbouring mines.
-        Opens all neighbouring empty squares and their neighbours'''
-        #self._open(x, y)
-        new_all = [(x, y)]
-        new_nums = []
-        Q = [(x,y)]
-        while Q:
-            for i,j in self.neighbours(*Q.pop(0)):
-                #if not already exposed OR flagged
-                if not self._grid[i][j] & 0b1100000:
-                    self._open(i, j)
-                    #in any case, add to new squares exposed
-                    new_all.append((i,j))
-                    if not self._grid[i][j] & 0b11111: #only check number
-                        Q.append((i,j))
-                    else: #if square does have number > 0, add to new_nums
-                        new_nums.append((i,j))
-        return new_nums, new_all
+        return self.engine.check_valid_coords(x, y)
 
     def _attempt_chord_with_splash(self, x, y):
-        '''Attempts to chord at square (x, y).
-        If an empty (number=0) square is opened, splash automatically applied.
-        Should only be called on an opened square (not checked)'''
-        #find number of cells flagged around this cell
-        num_flags = 0
-        for i, j in self.neighbours(x, y):
-            if self._is_flagged(i, j):
-                num_flags += 1
-        #if num flagged neighbours == number in square,
-        # open all the unflagged neighbours
-        if self._get_number(x, y) == num_flags:
-            for i, j in self.neighbours(x, y):
-                if not self._is_flagged(i, j):
-                    self._open(i, j)
-                    num = self._get_number(i, j) #return -1 for mines
-                    if num == -1:
-                        self._lose(i, j)
-                        break
-                    elif num == 0:
-                        self._splash(i, j)
-        if self.buttons_left == self.mine_number:
-            self._win()
-
-    def _is_flagged(self, x, y):
-        '''No input sanitisation'''
-        return self._grid[x][y] & 0b0100000 #flagged bit
-        #if square is opened, flagged bit should be 0
-
-    def _set_flag(self, x, y):
-        '''No input sanitisation. Updates mine counter'''
-        if not self._is_flagged(x, y):
-            self._decrement_mine_counter()
-        self._grid[x][y] |= 0b0100000 #set 'flagged' bit
-
-    def _clear_flag(self, x, y):
-        '''No input sanitisation. Updates mine counter'''
-        if self._is_flagged(x, y):
-            self._increment_mine_counter()
-        self._grid[x][y] &= 0b1011111 #clear 'flagged' bit
+        self.engine._attempt_chord_with_splash(x, y)
+        self._after_move()
 
     def _toggle_flag(self, x, y):
-        '''No input sanitisation. Updates mine counter'''
-        if self._is_flagged(x, y):
-            self._clear_flag(x, y)
-        else:
-            self._set_flag(x, y)
+        self.engine._toggle_flag(x, y)
+        self._after_move([x * self.grid_height + y])
 
     #******************** API FUNCTIONS FOR PLAYING THE GAME *******************
+    # These have the same behaviour as the MinesweeperEngine functions
 
     def get_mine_counter(self):
         '''Returns the number shown in the top left corner'''
-        return self.mine_counter
+        return self.engine.get_mine_counter()
 
     def get_mine_number(self):
         '''Returns the total number of mines in the grid'''
-        return self.mine_number
+        return self.engine.get_mine_number()
 
     def is_opened(self, x, y):
-        '''Return whether this grid square has been opened
-        (ie number is visible, either because it has been clicked,
-        or it is part of a large opening)'''
-        valid, error = self.check_valid_coords(x, y)
-        if not valid:
-            raise AssertionError(error)
-        return self._is_opened(x, y)
+        '''Return whether this grid square has been opened'''
+        return self.engine.is_opened(x, y)
 
     def is_flagged(self, x, y):
         '''Returns whether this grid square is flagged'''
-        valid, error = self.check_valid_coords(x, y)
-        if not valid:
-            raise AssertionError(error)
-        return self._is_flagged(x, y)
+        return self.engine.is_flagged(x, y)
 
     def set_flag(self, x, y):
         '''Sets flag on square. Should only be called on an unopened square'''
-        valid, error = self.check_valid_coords(x, y)
-        if not valid:
-            raise AssertionError(error)
-        if self._is_opened(x, y):
-            raise AssertionError(f'square {x}, {y} is opened. Cannot set flag')
-        self._set_flag(x, y)
+        self.engine.set_flag(x, y)
+        self._after_move([x * self.grid_height + y])
 
     def clear_flag(self, x, y):
         '''Clears flag from square. Should only be called on an unopened square'''
-        valid, error = self.check_valid_coords(x, y)
-        if not valid:
-            raise AssertionError(error)
-        if self._is_opened(x, y):
-            raise AssertionError(f'square {x}, {y} is opened. Cannot set/clear flag')
-        self._clear_flag(x, y)
+        self.engine.clear_flag(x, y)
+        self._after_move([x * self.grid_height + y])
 
     def toggle_flag(self, x, y):
         '''Toggles flag on square. Should only be called on an unopened square'''
-        valid, error = self.check_valid_coords(x, y)
-        if not valid:
-            raise AssertionError(error)
-        if self._is_opened(x, y):
-            raise AssertionError(f'square {x}, {y} is opened. Cannot toggle flag')
-        self._toggle_flag()
+        self.engine.toggle_flag(x, y)
+        self._after_move([x * self.grid_height + y])
 
     def get_number(self, x, y):
         '''Return the number in the square (x, y).
         Should only be called on an opened square'''
-        valid, error = self.check_valid_coords(x, y)
-        if not valid:
-            raise AssertionError(error)
-        if not self._is_opened(x, y):
-            raise AssertionError(f'square {x}, {y} is unopened. Cannot get number')
-        return self._get_number(x, y)
+        return self.engine.get_number(x, y)
 
     def open_square(self, x, y, do_splash=False):
         '''Open an unopened square.
         -> 1 if you opened a mined square, else 0'''
-        valid, error = self.check_valid_coords(x, y)
-        if not valid:
-            raise AssertionError(error)
-        if self._is_opened(x, y):
-            raise AssertionError(f'square {x}, {y} is already opened')
-        if self._is_flagged(x, y):
-            raise AssertionError(f'flagged square {x}, {y} cannot be opened')
-        
-        self._open(x, y)
-##        ret = [(x, y)], [(x, y)]
-
-        lost = False
-        #if you clicked on a mine, you lose
-        if self._is_mine(x, y):
-            #BUT if this is the first click, the game will
-            # move the mine for you because it's nice :)
-            if (self.is_virgin and
-                self.mine_number < self.grid_width * self.grid_height):
-                self._remove_mine(x, y) #make not mine
-                #random new square for this mine
-                i = random.randint(0, self.grid_width - 1)
-                j = random.randint(0, self.grid_height - 1)
-                #make sure we don't put it back in the same square
-                if (i, j) == (x, y):
-                    i = (i + 1) % self.width
-                #keep trying until we find a square without a mine in it
-                while not self._add_mine(i, j):
-                    i = random.randint(0, self.grid_width - 1)
-                    j = random.randint(0, self.grid_height - 1)
-                    if (i, j) == (x, y):
-                        i = (i + 1) % self.grid_width
-            else:
-                self._lose(x, y)
-                lost = True
-        #if number is 0, and splash enabled, clear the whole opening
-        if do_splash and self._get_number(x, y) == 0:
-##            ret = self._splash(x, y)
-            self._splash(x, y)
-        #if all unmined cells are opened, then you win
-        if self.buttons_left == self.mine_number:
-            self._win()
-        #if this is the player's first move, start the timer
-        if self.is_virgin:
-            #start timer after first click
-            self.app.reset_timer() #sanity check the timer to zero
-            self.app.start_timer()
-            self.is_virgin = False
-##        return ret
-
-        return 1 if lost else 0
+        ret = self.engine.open_square(x, y, do_splash)
+        self._after_move()
+        return ret
 
     def open_square_with_splash(self, x, y):
         return self.open_square(x, y, do_splash=True)
 
+    def open_squares(self, xs, ys, do_splash=True):
+        '''Open many squares, with one update of the app afterwards.
+        See MinesweeperEngine.open_squares()'''
+        num_opened = self.engine.open_squares(xs, ys, do_splash)
+        self._after_move()
+        return num_opened
+
+    def flag_squares(self, xs, ys):
+        '''Flag many squares, with one update of the mine counter.
+        See MinesweeperEngine.flag_squares()'''
+        num_flagged = self.engine.flag_squares(xs, ys)
+        self._after_move(np.asarray(xs, dtype=np.intp) * self.grid_height
+                         + np.asarray(ys, dtype=np.intp))
+        return num_flagged
+
+    def play_move(self, kind, x, y):
+        '''Make a move of one of the MOVE_* kinds.
+        See MinesweeperEngine.play_move()'''
+        self.engine.play_move(kind, x, y)
+        self._after_move([x * self.grid_height + y])
+
     def get_grid(self, output_grid):
         '''Copy the grid (as the player sees it) to output_grid.
-        Modifies output_grid in-place, placing -1 for unopened cells,
-        -2 for flagged cells, and the cell's number for opened cells.
-        output_grid should already have the correct dimensions.
-        Should only be used while game is in progress (not won or lost)'''
-        def convert_code(internal_code):
-            if internal_code & 0b1000000: #is opened
-                return internal_code & 0b1111 #number
-            elif internal_code & 0b100000: #is flagged
-                return -2
-            else:
-                return -1
-            #no cells should be opened and mined
-        for i in range(self.grid_width):
-            for j in range(self.grid_height):
-                output_grid[i][j] = convert_code(self._grid[i][j])
+        See MinesweeperEngine.get_grid()'''
+        self.engine.get_grid(output_grid)
+
+    def get_player_view(self):
+        '''Read-only, live view of the grid as the player sees it.
+        See MinesweeperEngine.get_player_view()'''
+        return self.engine.get_player_view()
 
     #****************************** GUI FUNCTIONS ******************************
 
@@ -975,9 +868,9 @@ class MinesweeperGrid:
         if self.allow_gui:
             if not (self.won or self.lost):
                 square = self.pos_to_square(pos)
-                if self._is_opened(*square):
+                if self.engine._is_opened(*square):
                     self._attempt_chord_with_splash(*square)
-                elif not self._is_flagged(*square):
+                elif not self.engine._is_flagged(*square):
                     self.open_square_with_splash(*square)
 
     def on_right_click(self, pos):
@@ -985,33 +878,101 @@ class MinesweeperGrid:
         if self.allow_gui:
             if not (self.won or self.lost):
                 square = self.pos_to_square(pos)
-                if self._is_opened(*square):
+                if self.engine._is_opened(*square):
                     self._attempt_chord_with_splash(*square)
                 else:
                     self._toggle_flag(*square)
 
-    def draw(self):
-        for i in range(self.grid_width):
-            for j in range(self.grid_height):
-                if self.lost and self._is_mine(i, j):
-                    img = self.redbomb_img
-                elif self.lost and self._is_flagged(i, j):
-                    img = self.xbomb_img
-                else:
-                    if self._is_opened(i, j):
-                        num = self._get_number(i, j)
-                        img = self.imgs[num]
-                    elif self._is_flagged(i, j):
-                        img = self.flagged_img
-                    else:
-                        img = self.btn_img
-                self.window.blit(img, self.square_to_pos(i, j))
+    def get_tiles(self, squares=None):
+        '''Work out how every square should look, from the engine's state,
+        or only the squares with these flat indices.
+        -> np.ndarray of tile numbers (see TILE_BUTTON etc.), with shape
+           (grid_width, grid_height), or the same shape as squares'''
+        view = self.engine.get_player_view()
+        grid = self.engine._grid
+        if squares is not None:
+            view = view.reshape(-1)[squares]
+            grid = grid.reshape(-1)[squares]
+        tiles = view.copy()
+        tiles[view == -1] = self.TILE_BUTTON
+        tiles[view == -2] = self.TILE_FLAGGED
+        if self.lost:
+            tiles[(grid & 0b10000) != 0] = self.TILE_MINE
+            tiles[(grid & 0b110000) == 0b100000] = self.TILE_WRONG_FLAG
+        return tiles
+
+    def mark_all_dirty(self):
+        '''Make the next draw() call draw every square'''
+        self._drawn_tiles = None
+        self._dirty = []
+
+    def mark_dirty(self, squares):
+        '''Make the next draw() call check these squares (flat indices).
+        Moves made through this grid do this themselves; changes made
+        directly on the engine need this (or mark_all_dirty())'''
+        self._dirty.append(np.asarray(squares, dtype=np.intp))
+
+    #above this many changed squares, draw() updates their bounding rect
+    MAX_DIRTY_RECTS = 64
+
+    def draw(self, redraw_all=False):
+        '''Update the squares that have changed since the last call on the
+        board surface, and copy them to the window (or copy the whole
+        board, if redraw_all is True).
+        Only the squares marked dirty since the last call (see _after_move()
+        and mark_dirty()) are looked at, and only those that look different
+        to last time are drawn, so a frame where nothing happened costs
+        nothing.
+        -> list of pygame.Rect areas of the window that were drawn on'''
+        if self._drawn_tiles is None:
+            self._drawn_tiles = self.get_tiles().reshape(-1)
+            self._dirty = []
+            changed = np.arange(len(self._drawn_tiles))
+        elif self._dirty:
+            squares = np.unique(np.concatenate(self._dirty))
+            self._dirty = []
+            tiles = self.get_tiles(squares)
+            different = tiles != self._drawn_tiles[squares]
+            changed = squares[different]
+            self._drawn_tiles[changed] = tiles[different]
+        else:
+            changed = ()
+        xs, ys = np.divmod(changed, self.grid_height)
+        S = self.SQUARE
+        if len(xs):
+            atlas, areas = self.atlas, self._tile_areas
+            self.board_surface.blits(
+                [(atlas, (px, py), areas[tile]) for px, py, tile in
+                 zip((S * xs).tolist(), (S * ys).tolist(),
+                     self._drawn_tiles[changed].tolist())],
+                doreturn=False)
+
+        left, top = self.rect[0], self.rect[1]
+        if redraw_all:
+            self.window.blit(self.board_surface, (left, top))
+            return [pygame.Rect(self.rect)]
+        if not len(xs):
+            return []
+        if len(xs) > self.MAX_DIRTY_RECTS:
+            x0, y0 = int(xs.min()), int(ys.min())
+            x1, y1 = int(xs.max()) + 1, int(ys.max()) + 1
+            area = pygame.Rect(S * x0, S * y0, S * (x1 - x0), S * (y1 - y0))
+            self.window.blit(self.board_surface, (left + area.x, top + area.y),
+                             area)
+            return [area.move(left, top)]
+        dirty_rects = [pygame.Rect(px, py, S, S) for px, py in
+                       zip((S * xs).tolist(), (S * ys).tolist())]
+        self.window.blits([(self.board_surface, (left + r.x, top + r.y), r)
+                           for r in dirty_rects], doreturn=False)
+        return [r.move(left, top) for r in dirty_rects]
 
 def open_all(minesweeper_grid):
     '''For demonstration purposes only'''
-    for i in range(minesweeper_grid.grid_width):
-        for j in range(minesweeper_grid.grid_height):
-            minesweeper_grid._open(i, j)
+    engine = minesweeper_grid.engine
+    for i in range(engine.grid_width):
+        for j in range(engine.grid_height):
+            engine._open(i, j)
+    minesweeper_grid.mark_all_dirty()
 
 #------------------------------------ MAINLOOP ---------------------------------
 
@@ -1,19 +1,27 @@
 import numpy as np
-import math, itertools
+import math, itertools, time
+from dataclasses import dataclass
+from collections import deque, OrderedDict
+
+import profiling
+from engine import count_neighbours
 
 class GroupNode:
     #node in a graph structure representing the cell groups and their intersections
     #edges are bidirectional
+    #there can be thousands of these, so they have slots instead of a __dict__
+    __slots__ = ('cells', 'num_mines', 'id', 'edges')
     def __init__(self, cells, num_mines, group_i):
         self.cells = cells
         self.num_mines = num_mines
         self.id = group_i
-        self.edges = [] #contains references to other GroupNode's
+        #contains references to other GroupNode's. Edges to groups that no
+        # longer intersect this one (eg deleted groups, which have no cells)
+        # are dropped lazily, when the rules next look at this group
+        self.edges = []
     def add_edge(self, edge):
-        #possible TODO: check for duplicates (shouldn't be neccesary at the moment)
         self.edges.append(edge)
     def remove_edge(self, edge):
-        #possible TODO: remove duplicates too
         self.edges.remove(edge)
     def num_edges(self):
         return len(self.edges)
@@ -23,153 +31,369 @@ class GroupNode:
              'edges=('+','.join(str(g.id) for g in self.edges)+'))'
         ))
 
+#the cells of a deleted group
+_NO_CELLS = frozenset()
+
+#the rules of RulesetAnalysis._propagate(), as counted in .rules_fired
+RULES = (
+    'known_cells',   #cells found to be mines/safe are taken out of a group
+    'all_mines',     #as many cells as mines
+    'no_cells',      #nothing left in the group
+    'all_safe',      #no mines
+    'subset_equal',  #a subset has the same number of mines: the rest are safe
+    'subset_mines',  #the rest of the cells of a superset are all mines
+    'subset_split',  #a superset is split, to take out the subset
+    'overlap',       #"1 of 2, 2 of 3": an overlap decides both groups
+)
+
+class RulesetAnalysis:
+    '''Persistent version of analyse_with_ruleset(), which can be brought up
+    to date after each move instead of being rebuilt from scratch.
+    Create it from the player's view of the grid, then call .update() with the
+    cells revealed and flagged since the last update. Only the groups
+    containing those cells, and the new groups from newly revealed numbers,
+    are looked at again.
+    Cell indices are positions in .unexplored_cells, which lists the cells that
+    were unexplored when the analysis was created (.cell_coords holds the same
+    coordinates as an array, and .cell_index[x, y] looks up a cell's index).
+    Cells keep their index after they are opened, but are removed from all
+    groups.
+    .rule_applications is how many times the rules were applied to a group
+    by the last update (or when the analysis was created), and .rules_fired
+    counts how many times each rule (see RULES) changed a group.'''
+    def __init__(self, grid, num_mines, debug=False, verbose=False):
+        if debug:
+            print(f'RulesetAnalysis created with debug output, and {verbose = }')
+        self.grid = grid
+        self.num_mines = num_mines
+        self.debug = debug
+        self.verbose = verbose
+        #make a list of unexplored cells, and a grid-shaped array to look up
+        # a cell's index in that list (-1 for cells that were already opened)
+        unexplored = grid < 0 #-1: unexplored cell, -2: flagged cell
+        self.cell_coords = np.argwhere(unexplored)
+        self.unexplored_cells = list(map(tuple, self.cell_coords.tolist()))
+        self.cell_index = np.full(grid.shape, -1, dtype=np.intp)
+        self.cell_index[unexplored] = np.arange(len(self.unexplored_cells))
+        self.sure_mine_positions = set( #prob = 1
+            np.flatnonzero(grid[unexplored] == -2).tolist())
+        self.sure_safe_positions = set() #prob = 0
+        #sure positions found since the last call to .take_new_positions()
+        self.new_mine_positions = list(self.sure_mine_positions)
+        self.new_safe_positions = []
+
+        #make a dict of groups (they encompass the information given to us by
+        # the numbers in explored cells)
+        self.cell_groups = dict()
+        #inverted index: unexplored cell index -> list of ids of groups
+        # containing that cell (at most 8, so a list is smaller than a set
+        # and just as fast). Used to find the groups a group intersects
+        self.groups_of_cell = dict()
+        self.next_group_id = 0
+        #time spent linking groups, while profiling (see _add_groups())
+        self._edge_seconds = None
+        self._propagate(self._add_groups(np.argwhere(grid > 0).tolist()))
+
+    def _get_adjacent_for_group(self, i, j):
+        #returns a set of indices of unexplored cells adjacent to (i, j)
+        #((i, j) itself is opened, so it isn't included)
+        i0, j0 = max(i - 1, 0), max(j - 1, 0)
+        still_unexplored = self.grid[i0:i+2, j0:j+2] < 0
+        return set(self.cell_index[i0:i+2, j0:j+2][still_unexplored].tolist())
+
+    def _add_group(self, i, j):
+        '''Make a group from the number in opened cell (i, j), and link it to
+        the groups it intersects (connect graph nodes with edges).
+        -> the new GroupNode, or None if an identical group already exists
+           or the group would have no unknown cells'''
+        cells = self._get_adjacent_for_group(i, j)
+        #a number with only known mines around it (eg one opened by a
+        # trivial move) tells us nothing new
+        if cells <= self.sure_mine_positions:
+            return None
+        num_mines = int(self.grid[i, j])
+        #only groups that share a cell with this one can intersect it
+        neighbour_ids = set()
+        for cell_i in cells:
+            neighbour_ids.update(self.groups_of_cell.get(cell_i, ()))
+        for other_id in neighbour_ids:
+            other_group = self.cell_groups[other_id]
+            if (other_group.cells == cells
+                and other_group.num_mines == num_mines):
+                return None
+        group = GroupNode(cells, num_mines, self.next_group_id)
+        self.next_group_id += 1
+        self.cell_groups[group.id] = group
+        for cell_i in cells:
+            self.groups_of_cell.setdefault(cell_i, []).append(group.id)
+        if self._edge_seconds is None:
+            self._link_group(group, neighbour_ids)
+        else:
+            start = time.perf_counter()
+            self._link_group(group, neighbour_ids)
+            self._edge_seconds += time.perf_counter() - start
+        return group
+
+    def _link_group(self, group, neighbour_ids):
+        for other_id in sorted(neighbour_ids):
+            other_group = self.cell_groups[other_id]
+            group.add_edge(other_group)
+            other_group.add_edge(group)
+
+    def _add_groups(self, coords):
+        '''Make groups from the numbers in these opened cells ((x, y) pairs).
+        -> list of ids of the new groups'''
+        prof = profiling.profiler
+        if prof is not None:
+            start = time.perf_counter()
+            self._edge_seconds = 0.0
+        new_ids = []
+        for i, j in coords:
+            group = self._add_group(i, j)
+            if group is not None:
+                new_ids.append(group.id)
+        if prof is not None:
+            prof.add('groups', start)
+            prof.add_time('edges', self._edge_seconds)
+            self._edge_seconds = None
+        return new_ids
+
+    def _remove_cells(self, group, cells):
+        '''Take cells out of a group, keeping .groups_of_cell up to date'''
+        removed = group.cells & cells
+        if removed:
+            for cell_i in removed:
+                self._unlink_cell(group, cell_i)
+            group.cells = group.cells - removed
+
+    def _unlink_cell(self, group, cell_i):
+        group_ids = self.groups_of_cell[cell_i]
+        group_ids.remove(group.id)
+        if not group_ids:
+            del self.groups_of_cell[cell_i]
+
+    def _delete_group(self, group):
+        for cell_i in group.cells:
+            self._unlink_cell(group, cell_i)
+        del self.cell_groups[group.id]
+        #its neighbours drop their edges to it lazily (see GroupNode)
+        group.cells = _NO_CELLS
+
+    def _mark_mines(self, cells):
+        new = cells - self.sure_mine_positions
+        self.sure_mine_positions.update(new)
+        self.new_mine_positions.extend(new)
+
+    def _mark_safe(self, cells):
+        new = cells - self.sure_safe_positions
+        self.sure_safe_positions.update(new)
+        self.new_safe_positions.extend(new)
+
+    def _propagate(self, active_groups):
+        '''Simplify the problem by finding sure locations of mines (and safe
+        cells), using a simple ruleset, starting from the groups in
+        active_groups (a list of group ids).
+        Groups are looked at in the order they are queued, and a group is
+        only in the queue once: queueing it again before it is looked at
+        does nothing. The number of groups looked at is kept in
+        .rule_applications'''
+        # Note this ruleset will not always find all sure mined/safe positions - it is not mathematically sufficient.
+        # However it will always mark positions correctly, and is sufficient to solve the vast majority of cases.
+        prof = profiling.profiler
+        if prof is not None:
+            start = time.perf_counter()
+        cell_groups = self.cell_groups
+        sure_mine_positions = self.sure_mine_positions
+        sure_safe_positions = self.sure_safe_positions
+        queue = deque(active_groups)
+        queued = set(queue)
+        def enqueue(gid):
+            if gid not in queued:
+                queued.add(gid)
+                queue.append(gid)
+        rule_applications = 0
+        fired = dict.fromkeys(RULES, 0)
+        #keep going until the queue is empty
+        while queue:
+            gid = queue.popleft()
+            queued.discard(gid)
+            group = cell_groups.get(gid)
+            if group is None: #deleted since it was queued
+                continue
+            rule_applications += 1
+            delete = False
+            done_sth = False
+            #update group with previously found mines and safe positions
+            #(this isn't done straight away when sure mine/safe positions updated - lazy update)
+            xm = group.cells & sure_mine_positions
+            xs = group.cells & sure_safe_positions
+            self._remove_cells(group, xm | xs)
+            group.num_mines -= len(xm)
+            if xm or xs:
+                fired['known_cells'] += 1
+                done_sth = True
+            #"checks for triviality"
+            if len(group.cells) == group.num_mines: #number of cells equals number of mines -> they are all mines
+                fired['all_mines'] += 1
+                delete = True
+                done_sth = True
+                self._mark_mines(group.cells)
+            elif len(group.cells) == 0: #empty group
+                fired['no_cells'] += 1
+                delete = True
+                done_sth = True
+            elif group.num_mines == 0: #group with no mines
+                fired['all_safe'] += 1
+                self._mark_safe(group.cells)
+                delete = True
+                done_sth = True
+            #rules involving intersecting groups
+            else:
+                #We check if groups still intersect in this for loop, and only keep the edges of those that do
+                # (lazy update of graph edges). The other group drops its edge to this one when it is looked at.
+                #Building a new list is O(degree), where removing edges from the list one by one would be O(degree^2)
+                edges = group.edges
+                group.edges = kept_edges = []
+                for other_group in edges:
+                    #check if they still intersect (lazy update of graph edges)
+                    if not (group.cells & other_group.cells):
+                        continue
+                    kept_edges.append(other_group)
+                    #if group is a superset of another
+                    if group.cells.issuperset(other_group.cells):
+                        if group.num_mines == other_group.num_mines:
+                            #numbers equal: the bigger group is spurious
+                            fired['subset_equal'] += 1
+                            self._mark_safe(group.cells - other_group.cells)
+                            delete = True
+                            done_sth = True
+                        elif group.num_mines - other_group.num_mines == len(group.cells) - len(other_group.cells):
+                            #difference in numbers = difference in sizes: difference is all mines
+                            fired['subset_mines'] += 1
+                            self._mark_mines(group.cells - other_group.cells)
+                            delete = True
+                            done_sth = True
+                        else: #otherwise: split to avoid overlap
+                            fired['subset_split'] += 1
+                            self._remove_cells(group, other_group.cells)
+                            group.num_mines -= other_group.num_mines
+                            done_sth = True
+                    #check for another special condition ("1 of 2, 2 of 3")
+                    else:
+                        x = group.cells & other_group.cells #set intersection
+                        if (group.num_mines == len(x) - 1 and other_group.num_mines == len(other_group.cells - x) + group.num_mines):
+                            fired['overlap'] += 1
+                            self._mark_mines(other_tail := other_group.cells - x)
+                            self._remove_cells(other_group, other_tail)
+                            other_group.num_mines -= len(other_tail)
+                            self._mark_safe(group.cells - x)
+                            delete = True
+                            done_sth = True
+            if delete:
+                self._delete_group(group)
+            if done_sth:
+                if not delete:
+                    enqueue(group.id)
+                for other_group in group.edges:
+                    enqueue(other_group.id)
+        self.rule_applications = rule_applications
+        self.rules_fired = fired
+        if prof is not None:
+            prof.add('propagate', start)
+            prof.count('rule_applications', rule_applications)
+            for rule, n in fired.items():
+                if n:
+                    prof.count('rule: ' + rule, n)
+
+        if self.debug and self.verbose:
+            print('Cell groups:', list(cell_groups.values()))
+            print('Sure mine positions:', sure_mine_positions)
+            print('Sure safe positions:', sure_safe_positions)
+
+    def update(self, revealed=(), flagged=()):
+        '''Bring the analysis up to date after some moves.
+        revealed - flat indices (x * grid_height + y) of the cells opened since
+                   the last update, like MinesweeperEngine.last_revealed
+        flagged  - (x, y) coords of the cells flagged since the last update
+        .grid must already show the new state of the game.
+        -> is_possible (see .is_possible())'''
+        changed = set()
+        #flags are trusted, just like when the analysis was created
+        for x, y in flagged:
+            cell_i = int(self.cell_index[x, y])
+            self.sure_mine_positions.add(cell_i)
+            changed.add(cell_i)
+        revealed = np.asarray(revealed, dtype=np.intp)
+        opened = set(self.cell_index.reshape(-1)[revealed].tolist())
+        changed |= opened
+        #opened cells are safe, so they can just be taken out of their groups
+        affected_ids = set()
+        for cell_i in changed:
+            affected_ids.update(self.groups_of_cell.get(cell_i, ()))
+        active_groups = sorted(affected_ids)
+        for gid in active_groups:
+            self._remove_cells(self.cell_groups[gid], opened)
+        #the numbers in opened cells give us new groups
+        numbered = revealed[self.grid.reshape(-1)[revealed] > 0]
+        xs, ys = np.divmod(numbered, self.grid.shape[1])
+        active_groups.extend(self._add_groups(zip(xs.tolist(), ys.tolist())))
+        self._propagate(active_groups)
+        return self.is_possible()
+
+    def is_possible(self):
+        '''False if the sure mine positions need more mines than the grid has'''
+        num_mines_unsure = self.num_mines - len(self.sure_mine_positions)
+        if num_mines_unsure < 0:
+            if self.debug:
+                print('not enough mines for sure mine positions')
+            return False
+        return True
+
+    def get_cell_groups(self):
+        return list(self.cell_groups.values())
+
+    def take_new_positions(self):
+        '''Sure mine and safe positions found since this was last called
+        -> new_mine_positions, new_safe_positions'''
+        new = self.new_mine_positions, self.new_safe_positions
+        self.new_mine_positions = []
+        self.new_safe_positions = []
+        return new
+
+def find_trivial_cells(grid):
+    '''Find every cell that a single number shows is mined or safe, for the
+    whole grid at once: numbers with as many unexplored neighbours as mines
+    left around them (all the unexplored neighbours are mines), and numbers
+    with all their mines flagged (all the unexplored neighbours are safe).
+    This is much cheaper than the full ruleset, and finds most sure cells
+    in a normal game. Flags are trusted.
+    -> sure_mines, sure_safe: bool arrays with the same shape as the grid'''
+    unexplored = grid == -1
+    #two counts at once: unexplored neighbours in the low 4 bits, and
+    # flagged neighbours in the high 4 bits
+    counts = count_neighbours(unexplored + 16 * (grid == -2).view(np.uint8))
+    num_unexplored = counts & 0b1111
+    mines_left = grid - (counts >> 4).view(np.int8)
+    numbered = (grid > 0) & (num_unexplored > 0)
+    all_mines = numbered & (mines_left == num_unexplored)
+    all_safe = numbered & (mines_left == 0)
+    #and which unexplored cells are next to each kind of number
+    counts = count_neighbours(all_mines + 16 * all_safe.view(np.uint8))
+    sure_mines = unexplored & ((counts & 0b1111) > 0)
+    sure_safe = unexplored & ((counts >> 4) > 0)
+    return sure_mines, sure_safe
+
 def analyse_with_ruleset(grid, num_mines, debug=False, verbose=False):
     '''Determine which cells definitely do/don't contain mines, and consolidate
     the information we know about the rest in `cell_groups`. If position is
     impossible, False is returned as the first value in the tuple.
+    See RulesetAnalysis to keep the analysis up to date as the game goes on.
     -> is_possible, unexplored_cells, cell_groups, sure_mine_positions, sure_safe_positions'''
-    if debug:
-        print(f'analyse_with_ruleset() called with debug output, and {verbose = }')
-    #make a list of unexplored cells
-    unexplored_cells = []
-    sure_mine_positions = set()
-    for (i, j), val in np.ndenumerate(grid):
-        if val == -1:
-            unexplored_cells.append((i, j))
-        elif val == -2:
-            sure_mine_positions.add(len(unexplored_cells))
-            unexplored_cells.append((i, j))
-
-    def get_adjacent_for_group(i, j):
-         #returns a set of indices of unexplored cells adjacent to (i, j)
-        adj = set()
-        for k, l in ((i-1,j-1), (i-1,j), (i-1,j+1), (i, j-1), (i,j+1),
-                     (i+1, j-1), (i+1, j), (i+1,j+1)):
-            if (0 <= k < grid.shape[0] and 0 <= l < grid.shape[1]
-                and grid[k, l] in (-1, -2)):
-                adj.add(unexplored_cells.index((k, l)))
-        return adj
-
-    #make a list of groups (they encompass the information given to us by
-    # the numbers in explored cells)
-    cell_groups = dict()
-    cell_groups_list = []
-    group_i = 0
-    for (i, j), val in np.ndenumerate(grid):
-        if val > 0:
-            new_group = GroupNode(get_adjacent_for_group(i, j), val, group_i)
-            if new_group not in cell_groups_list:
-                cell_groups[group_i] = new_group
-                cell_groups_list.append(new_group)
-                group_i += 1
-
-    #add 'hyper'links between groups that intersect (connect graph nodes with edges)
-    for i, group in enumerate(cell_groups_list):
-        for other_group in cell_groups_list[i+1:]:
-            if group.cells & other_group.cells: #if there is an intersection
-                group.add_edge(other_group)
-                other_group.add_edge(group)
-    del cell_groups_list
-
-    #Simplify the problem by finding sure locations of mines (and safe cells), using a simple ruleset
-    # Note this ruleset will not always find all sure mined/safe positions - it is not mathematically sufficient.
-    # However it will always mark positions correctly, and is sufficient to solve the vast majority of cases.
-    sure_mine_positions = sure_mine_positions #prob = 1
-    sure_safe_positions = set()               #prob = 0
-    active_groups = list(range(group_i))#[g.id for g in cell_groups_list] #a queue
-    #keep going until the queue is empty
-    while active_groups:
-        gid = active_groups.pop(0)
-        try:
-            group = cell_groups[gid]
-        except KeyError:
-            continue
-        delete = False
-        done_sth = False
-        #update group with previously found mines and safe positions
-        #(this isn't done straight away when sure mine/safe positions updated - lazy update)
-        xm = group.cells & sure_mine_positions
-        xs = group.cells & sure_safe_positions
-        group.cells = group.cells - xm - xs
-        group.num_mines -= len(xm)
-        if xm or xs:
-            done_sth = True
-        #"checks for triviality"
-        if len(group.cells) == group.num_mines: #number of cells equals number of mines -> they are all mines
-            delete = True
-            done_sth = True
-            sure_mine_positions.update(group.cells)
-        elif len(group.cells) == 0: #empty group
-            delete = True
-            done_sth = True
-        elif group.num_mines == 0: #group with no mines
-            sure_safe_positions.update(group.cells)
-            delete = True
-            done_sth = True
-        #rules involving intersecting groups
-        else:
-            #Constructing a new list from group.edges (a list) in the top line of the for loop avoids RuntimeErrors
-            #when we try to remove items of group.edges ("set size changed during iteration")
-            # - we check if groups still intersect in this for loop, and delete edges if they don't.
-            #In Python's internals, this new list is constructed once at the start of the for loop,
-            #making it a snapshot of group.edges before the loop runs. This means we can iterate over all the edges
-            #originally in the set, while being allowed to delete some of them.
-            for other_group in list(group.edges): 
-                #check if they still intersect (lazy update of graph edges)
-                if not (group.cells & other_group.cells):
-                    group.remove_edge(other_group)
-                    other_group.remove_edge(group)
-                    continue
-                #if group is a superset of another
-                if group.cells.issuperset(other_group.cells):
-                    if group.num_mines == other_group.num_mines:
-                        #numbers equal: the bigger group is spurious
-                        sure_safe_positions.update(group.cells - other_group.cells)
-                        delete = True
-                        done_sth = True
-                    elif group.num_mines - other_group.num_mines == len(group.cells) - len(other_group.cells):
-                        #difference in numbers = difference in sizes: difference is all mines
-                        sure_mine_positions.update(group.cells - other_group.cells)
-                        delete = True
-                        done_sth = True
-                    else: #otherwise: split to avoid overlap
-                        group.cells -= other_group.cells
-                        group.num_mines -= other_group.num_mines
-                        done_sth = True
-                #check for another special condition ("1 of 2, 2 of 3")
-                else:
-                    x = group.cells & other_group.cells #set intersection
-                    if (group.num_mines == len(x) - 1 and other_group.num_mines == len(other_group.cells - x) + group.num_mines):
-                        sure_mine_positions.update(other_tail := other_group.cells - x)
-                        other_group.cells -= other_tail
-                        other_group.num_mines -= len(other_tail)
-                        sure_safe_positions.update(group.cells - x)
-                        delete = True
-                        done_sth = True
-        if delete:
-            del cell_groups[group.id]
-            for other_group in group.edges:
-                other_group.remove_edge(group)
-        if done_sth:
-            if not delete:
-                active_groups.append(group.id)
-            for other_group in group.edges:
-                active_groups.append(other_group.id)
-    
-    cell_groups = [item[1] for item in cell_groups.items()] #convert back to list
-    
-    if debug and verbose:
-        print('Cell groups:', cell_groups)
-        print('Sure mine positions:', sure_mine_positions)
-        print('Sure safe positions:', sure_safe_positions)
-    
-    num_mines_unsure = num_mines - len(sure_mine_positions)
-    if num_mines_unsure < 0:
-        if debug:
-            print('not enough mines for sure mine positions')
+    analysis = RulesetAnalysis(grid, num_mines, debug, verbose)
+    if not analysis.is_possible():
         return False, None, None, None, None
-
-    return True, unexplored_cells, cell_groups, sure_mine_positions, sure_safe_positions
+    return (True, analysis.unexplored_cells, analysis.get_cell_groups(),
+            analysis.sure_mine_positions, analysis.sure_safe_positions)
 
 def estimate_probs(grid, unexplored_cells, cell_groups, num_mines_unsure,
                    sure_mine_positions, sure_safe_positions):
@@ -187,6 +411,9 @@ def estimate_probs(grid, unexplored_cells, cell_groups, num_mines_unsure,
     remaining_cells = (set(range(len(unexplored_cells))) -
                        set(sure_mine_positions) - set(sure_safe_positions))
     remaining_cells -= set().union(*(g.cells for g in cell_groups))
+    #unexplored_cells can include cells opened since the analysis was made
+    remaining_cells = set(c for c in remaining_cells
+                          if grid[unexplored_cells[c]] == -1)
     num_remaining_cells = len(remaining_cells)
     if num_remaining_cells:
         #how to estimate probability of these being mined?
@@ -207,12 +434,434 @@ def estimate_probs(grid, unexplored_cells, cell_groups, num_mines_unsure,
 ##    pprint(mine_probs)
     return mine_probs
 
+#Exact probabilities: the frontier is split into components (groups of cells
+# linked by shared constraints), the solutions of each component are counted
+# by how many mines they use, and the components are combined by weighting
+# each total by the number of ways of placing the rest of the mines in the
+# cells that aren't next to any number.
+#Counts are kept as floats: they can get far too big for exact integers to be
+# fast, and only ratios between them are ever used.
+
+MAX_COMPONENT_STATES = 50000 #solve_component gives up above this
+#exact_probs() only sends components with at least this many cells to a pool
+# of worker processes: smaller ones take less time to solve than to send
+PARALLEL_MIN_CELLS = 32
+
+def _frontier_order(num_cells, cons_cells, cons_of_cell):
+    '''Order the cells of a component breadth-first, so that cells which share
+    a constraint are close together. This keeps the number of constraints
+    that are partly assigned (and so the number of DP states) small'''
+    order = []
+    seen = [False] * num_cells
+    for start in range(num_cells):
+        if seen[start]:
+            continue
+        seen[start] = True
+        queue = deque([start])
+        while queue:
+            cell = queue.popleft()
+            order.append(cell)
+            for ci in cons_of_cell[cell]:
+                for other in cons_cells[ci]:
+                    if not seen[other]:
+                        seen[other] = True
+                        queue.append(other)
+    return order
+
+def solve_component(num_cells, constraints, max_states=MAX_COMPONENT_STATES):
+    '''Count the mine placements in one frontier component that satisfy all
+    of its constraints.
+    num_cells   - the cells are numbered 0 to num_cells-1
+    constraints - list of (cells, num_mines): exactly num_mines of the cells
+                  in the tuple `cells` are mines
+    -> counts, cell_counts (np arrays of floats), or None if there were too
+       many states to solve it
+    counts[k] is the number of placements with k mines in total, and
+    cell_counts[c, k] is the number of those with a mine in cell c'''
+    n = num_cells
+    cons_cells = [tuple(cells) for cells, _ in constraints]
+    cons_mines = [num_mines for _, num_mines in constraints]
+    cons_of_cell = [[] for _ in range(n)]
+    for ci, cells in enumerate(cons_cells):
+        for cell in cells:
+            cons_of_cell[cell].append(ci)
+    order = _frontier_order(n, cons_cells, cons_of_cell)
+    pos = [0] * n
+    for p, cell in enumerate(order):
+        pos[cell] = p
+    first = [min(pos[c] for c in cells) for cells in cons_cells]
+    last = [max(pos[c] for c in cells) for cells in cons_cells]
+
+    #The cells are assigned one at a time, in order. A state is a tuple of
+    # how many more mines each active constraint (one that has some but not
+    # all of its cells assigned) still needs. Work out how each step changes
+    # the state, ahead of time
+    plans = []
+    active = []
+    left = [len(cells) for cells in cons_cells] #cells not yet assigned
+    for p, cell in enumerate(order):
+        src_of = {ci: k for k, ci in enumerate(active)}
+        for ci in cons_of_cell[cell]:
+            left[ci] -= 1
+        contains = set(cons_of_cell[cell])
+        starting = [ci for ci in cons_of_cell[cell] if first[ci] == p]
+        after = [ci for ci in active + starting if last[ci] != p]
+        #(source index in old state or -1, initial need, does cell count,
+        # cells left after this one)
+        keep = [(src_of.get(ci, -1), cons_mines[ci], ci in contains, left[ci])
+                for ci in after]
+        closing = [(src_of.get(ci, -1), cons_mines[ci])
+                   for ci in cons_of_cell[cell] if last[ci] == p]
+        plans.append((keep, closing))
+        active = after
+
+    def step(state, plan, bit):
+        keep, closing = plan
+        for src, init in closing:
+            if (state[src] if src >= 0 else init) != bit:
+                return None
+        new_state = []
+        for src, init, contains, cells_left in keep:
+            need = state[src] if src >= 0 else init
+            if contains:
+                need -= bit
+                if need < 0 or need > cells_left:
+                    return None
+            new_state.append(need)
+        return tuple(new_state)
+
+    #forward pass: number of ways of reaching each state, by mines so far
+    start = np.zeros(n + 1)
+    start[0] = 1.0
+    layers = [{(): start}]
+    transitions = []
+    for p in range(n):
+        new_layer = {}
+        trans = []
+        for state, ways in layers[p].items():
+            t0 = step(state, plans[p], 0)
+            t1 = step(state, plans[p], 1)
+            if t0 is not None:
+                if t0 in new_layer:
+                    new_layer[t0] += ways
+                else:
+                    new_layer[t0] = ways.copy()
+            if t1 is not None:
+                if t1 not in new_layer:
+                    new_layer[t1] = np.zeros(n + 1)
+                new_layer[t1][1:] += ways[:-1]
+            trans.append((state, t0, t1))
+        if len(new_layer) > max_states:
+            return None
+        layers.append(new_layer)
+        transitions.append(trans)
+
+    #backward pass: number of ways of finishing from each state, by mines
+    # from here on. Combined with the forward pass, this gives the number of
+    # solutions with each cell mined
+    zero = np.zeros(n + 1)
+    end = np.zeros(n + 1)
+    end[0] = 1.0
+    completions = {(): end}
+    cell_counts = np.zeros((n, n + 1))
+    for p in range(n - 1, -1, -1):
+        prev_completions = {}
+        mined = np.zeros(n + 1)
+        for state, t0, t1 in transitions[p]:
+            ways = np.zeros(n + 1)
+            if t0 is not None:
+                ways += completions.get(t0, zero)
+            if t1 is not None:
+                after = completions.get(t1, zero)
+                ways[1:] += after[:-1]
+                if after.any():
+                    mined[1:] += np.convolve(layers[p][state], after)[:n]
+            prev_completions[state] = ways
+        cell_counts[order[p]] = mined
+        completions = prev_completions
+    return completions[()], cell_counts
+
+def _log_comb(n, k):
+    '''log(n choose k) for arrays of k; -inf where k is out of range'''
+    k = np.asarray(k, dtype=float)
+    valid = (k >= 0) & (k <= n)
+    kv = np.where(valid, k, 0)
+    lgamma = np.vectorize(math.lgamma)
+    out = math.lgamma(n + 1) - lgamma(kv + 1) - lgamma(n - kv + 1)
+    return np.where(valid, out, -np.inf)
+
+#The 8 rotations and reflections of the grid, as matrices (a, b, c, d)
+# mapping (x, y) to (a*x + b*y, c*x + d*y)
+_SYMMETRIES = ((1, 0, 0, 1), (0, -1, 1, 0), (-1, 0, 0, -1), (0, 1, -1, 0),
+               (-1, 0, 0, 1), (1, 0, 0, -1), (0, 1, 1, 0), (0, -1, -1, 0))
+
+def canonical_form(coords, constraints):
+    '''Describe a frontier component in a way that doesn't depend on where it
+    is in the grid, or how it is rotated or reflected.
+    coords      - grid coordinates of each cell in the component
+    constraints - list of (cells, num_mines), as for solve_component()
+    -> key, order
+    key is hashable, and equal for components with the same shape and numbers.
+    order[r] is the cell that comes r'th in the canonical numbering'''
+    n = len(coords)
+    best_key = best_order = None
+    for a, b, c, d in _SYMMETRIES:
+        moved = [(a*x + b*y, c*x + d*y) for x, y in coords]
+        min_x = min(p[0] for p in moved)
+        min_y = min(p[1] for p in moved)
+        moved = [(p[0] - min_x, p[1] - min_y) for p in moved]
+        order = sorted(range(n), key=moved.__getitem__)
+        rank = [0] * n
+        for r, cell in enumerate(order):
+            rank[cell] = r
+        key = (tuple(moved[cell] for cell in order),
+               tuple(sorted((tuple(sorted(rank[c] for c in cells)), num_mines)
+                            for cells, num_mines in constraints)))
+        if best_key is None or key < best_key:
+            best_key, best_order = key, order
+    return best_key, best_order
+
+class ComponentCache:
+    '''LRU cache of solve_component() results. Entries are keyed by
+    canonical_form(), so a pattern (eg. a 1-2-1 along an edge) is only solved
+    once, wherever it turns up and whichever way round it is - in later moves
+    and in later games. Memory use is limited to about max_bytes.'''
+    def __init__(self, max_bytes=64 * 2**20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict() #least recently used first
+
+    def solve(self, coords, constraints):
+        '''Same as solve_component(len(coords), constraints), but uses the
+        cache. coords are the grid coordinates of the cells'''
+        key, order, result = self.lookup(coords, constraints)
+        if result is None:
+            result = solve_component(len(coords), constraints)
+            self.store(key, order, result)
+        return result
+
+    def lookup(self, coords, constraints):
+        '''Look a component up without solving it (see .solve()).
+        -> key, order, result: the result is None if it isn't in the cache,
+           and key and order are for .store()'''
+        key, order = canonical_form(coords, constraints)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return key, order, None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        counts, canonical_cell_counts = entry
+        cell_counts = np.empty_like(canonical_cell_counts)
+        cell_counts[order] = canonical_cell_counts
+        return key, order, (counts, cell_counts)
+
+    def store(self, key, order, result):
+        '''Keep the result of solve_component() for a component that
+        .lookup() didn't find (nothing is kept if the result is None)'''
+        if result is None:
+            return
+        counts, cell_counts = result
+        self._entries[key] = (counts, cell_counts[order])
+        self.nbytes += counts.nbytes + cell_counts.nbytes
+        while self.nbytes > self.max_bytes and self._entries:
+            _, (old_counts, old_cell_counts) = self._entries.popitem(last=False)
+            self.nbytes -= old_counts.nbytes + old_cell_counts.nbytes
+
+    def hit_rate(self):
+        '''-> proportion of lookups that were found in the cache'''
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return (f'ComponentCache({len(self._entries)} entries, '
+                f'{self.nbytes} bytes, hit rate {self.hit_rate():.1%})')
+
+#shared by all solvers in this process, so patterns are reused across games
+component_cache = ComponentCache()
+
+def find_components(cell_groups):
+    '''Split groups into connected components of the group graph (following
+    only edges between groups that still share a cell).
+    -> list of lists of GroupNode'''
+    components = []
+    seen = set()
+    for group in cell_groups:
+        if group.id in seen or not group.cells:
+            continue
+        seen.add(group.id)
+        component = []
+        queue = deque([group])
+        while queue:
+            g = queue.popleft()
+            component.append(g)
+            for other_group in g.edges:
+                if (other_group.id not in seen
+                    and g.cells & other_group.cells):
+                    seen.add(other_group.id)
+                    queue.append(other_group)
+        components.append(component)
+    return components
+
+def _solve_components(problems, unexplored_cells, cache, pool):
+    '''Solve frontier components, given as (cells, constraints), for
+    exact_probs(). Components are looked up in the cache in this process; if
+    there are at least 2 big ones (see PARALLEL_MIN_CELLS) left to solve,
+    and a pool, they are solved in parallel in the pool.
+    -> list of results of solve_component(), in the same order'''
+    results = [None] * len(problems)
+    to_solve = [] #(problem index, cache key, order)
+    for i, (cells, constraints) in enumerate(problems):
+        key = order = None
+        if cache is not None:
+            coords = [unexplored_cells[c] for c in cells]
+            key, order, results[i] = cache.lookup(coords, constraints)
+            if results[i] is not None:
+                continue
+        to_solve.append((i, key, order))
+    big = [i for i, _, _ in to_solve
+           if len(problems[i][0]) >= PARALLEL_MIN_CELLS]
+    #(a set, as results can be None even when they've been solved)
+    solved_in_pool = set()
+    if pool is not None and len(big) >= 2:
+        #starmap keeps the order, so the results don't depend on the workers
+        for i, result in zip(big, pool.starmap(
+                solve_component,
+                [(len(problems[i][0]), problems[i][1]) for i in big])):
+            results[i] = result
+        solved_in_pool.update(big)
+    for i, key, order in to_solve:
+        if i not in solved_in_pool:
+            cells, constraints = problems[i]
+            results[i] = solve_component(len(cells), constraints)
+        if cache is not None:
+            cache.store(key, order, results[i])
+    return results
+
+def exact_probs(grid, unexplored_cells, cell_groups, num_mines_unsure,
+                sure_mine_positions, sure_safe_positions,
+                cache=component_cache, pool=None):
+    '''Calculate the exact probability of each square being a mine, given
+    the rules of the game and the output of the ruleset analysis.
+    num_mines_unsure is the number of mines that are not in
+    sure_mine_positions. Takes the same arguments as estimate_probs(), which
+    it falls back to if a component is too big to solve.
+    Components are solved through `cache` (a ComponentCache, or None to
+    solve every component from scratch). If a multiprocessing.Pool is given,
+    big components are solved in it in parallel (see _solve_components()),
+    with the same results.
+    -> np.ndarray of floats, shape of grid (2.0 for explored cells)'''
+    def fallback():
+        return estimate_probs(grid, unexplored_cells, cell_groups,
+                              num_mines_unsure, sure_mine_positions,
+                              sure_safe_positions)
+    sure_mines = set(sure_mine_positions)
+    sure_safe = set(sure_safe_positions)
+    mine_probs = np.full(grid.shape, 2.0)
+    unexplored = grid == -1
+    mine_probs[unexplored] = 0.0
+
+    #solve each frontier component on its own
+    problems = []
+    groups = [g for g in cell_groups if g.cells - sure_mines - sure_safe]
+    for component in find_components(groups):
+        cells = sorted(set().union(*(g.cells for g in component))
+                       - sure_mines - sure_safe)
+        local = {cell: k for k, cell in enumerate(cells)}
+        constraints = []
+        for g in component:
+            g_cells = g.cells - sure_mines - sure_safe
+            num_mines = g.num_mines - len(g.cells & sure_mines)
+            constraints.append((tuple(local[c] for c in g_cells), num_mines))
+        problems.append((cells, constraints))
+    solved = []
+    frontier = set()
+    for (cells, _), result in zip(problems, _solve_components(
+            problems, unexplored_cells, cache, pool)):
+        if result is None:
+            return fallback()
+        counts, cell_counts = result
+        #trim to the possible numbers of mines, and rescale to avoid overflow
+        scale = counts.max()
+        if scale == 0: #no solutions: position is impossible
+            return fallback()
+        solved.append((cells, counts / scale, cell_counts / scale))
+        frontier.update(cells)
+
+    #cells which aren't next to any number share the remaining mines equally
+    other = unexplored.copy()
+    for cell_i in frontier | sure_mines | sure_safe:
+        other[unexplored_cells[cell_i]] = False
+    num_other = int(np.count_nonzero(other))
+    total_cells = sum(len(cells) for cells, _, _ in solved)
+    #weights[k]: ways of placing the other mines if k are in the frontier
+    k = np.arange(total_cells + 1)
+    log_weights = _log_comb(num_other, num_mines_unsure - k)
+    if np.all(np.isneginf(log_weights)):
+        return fallback()
+    weights = np.exp(log_weights - log_weights.max())
+
+    #prefixes[j]: ways to place k mines in components before j
+    prefixes = [np.ones(1)]
+    for _, counts, _ in solved:
+        prefix = np.convolve(prefixes[-1], counts)
+        prefixes.append(prefix / prefix.max())
+    #suffix[t]: total weight of everything after component j, if there are
+    # t mines in the components up to j. Going backwards, combined with the
+    # prefixes, this gives each component's weight for each of its totals
+    suffix = weights
+    for j in range(len(solved) - 1, -1, -1):
+        cells, counts, cell_counts = solved[j]
+        component_weights = np.correlate(suffix, prefixes[j], mode='valid')
+        total = counts @ component_weights
+        if total <= 0:
+            return fallback()
+        probs = (cell_counts @ component_weights) / total
+        for cell_i, p in zip(cells, probs):
+            mine_probs[unexplored_cells[cell_i]] = p
+        suffix = np.correlate(suffix, counts, mode='valid')
+        suffix = suffix / suffix.max()
+
+    if num_other:
+        all_counts = prefixes[-1]
+        total = all_counts @ weights
+        expected_other = all_counts @ (weights * (num_mines_unsure - k))
+        mine_probs[other] = expected_other / (total * num_other)
+    for cell_i in sure_mines:
+        mine_probs[unexplored_cells[cell_i]] = 1.0
+    for cell_i in sure_safe:
+        if unexplored[unexplored_cells[cell_i]]:
+            mine_probs[unexplored_cells[cell_i]] = 0.0
+    return mine_probs
+
+@dataclass
+class GameResult:
+    '''Summary of one game played by BasicRulesetAI.play_game()'''
+    won : bool
+    moves : int   #flags placed and squares opened
+    guesses : int #squares opened without knowing they were safe
+    seconds : float
+
 class BasicRulesetAI:
     name = 'Basic Ruleset AI'
-    def __init__(self, move_delay=50, newgame_delay=1000, num_games=None):
-        self.move_delay = move_delay #limited to 1 move per frame
+    def __init__(self, move_delay=50, newgame_delay=1000, num_games=None,
+                 seed=None, batch_time_ms=10):
+        #with a delay, there is at most 1 move per frame. With move_delay=0,
+        # moves are made in batches instead, for up to batch_time_ms each
+        # frame, so the solver isn't held back by the framerate
+        self.move_delay = move_delay
+        self.batch_time_ms = batch_time_ms
         self.newgame_delay = newgame_delay
         self.stopped = True
+        self.running_action = None #the app's DelayedAction making the moves
         self.win_count = 0
         self.loss_count = 0
         #Will stop after this number of games (or go forever if is None)
@@ -225,14 +874,34 @@ class BasicRulesetAI:
         self.grid = None
         self.to_flag = []
         self.to_open = []
+        self.num_resets = 0 #calls to reset_solver(), see make_move()
+        self.set_seed(seed)
+
+    def set_seed(self, seed=None):
+        '''Give the solver its own random number generator (used to choose
+        between equally good guesses). seed can be an int, a
+        np.random.SeedSequence or None (unpredictable)'''
+        self.rng = np.random.default_rng(seed)
 
     def reset_solver(self):
-        self.grid = np.zeros((self.game.grid_width, self.game.grid_height),
-                             dtype=int)
+        self.num_resets += 1
+        #live view of the grid, updated by the game as moves are made
+        self.grid = self.game.get_player_view()
+        self.analysis = None
+        #cells changed by our moves since the analysis was last updated
+        self.revealed = [] #arrays of flat indices, from game.last_revealed
+        self.flagged = []  #(x, y) coords
         self.to_flag = []
         self.to_open = []
+        #game.num_moves after our last move: if it changes, someone else has
+        # played (eg clicked the grid while we play), so the analysis is stale
+        self.moves_seen = 0
+        #statistics for the current game
+        self.move_count = 0
+        self.guess_count = 0
 
     def attach(self, minesweeper_app):
+        from pygame.locals import K_SPACE, K_PERIOD
         self.app = minesweeper_app
         self.game = minesweeper_app.minesweeper_grid
         self.attached = True
@@ -240,88 +909,208 @@ class BasicRulesetAI:
         
         self.app.bind_key(K_SPACE, False, False, False, self.pause_play)
         self.app.bind_key(K_PERIOD, False, False, False, self.single_move_if_stopped)
-        self.app.set_win_callback(lambda app_self: self.reset_solver())
-        self.app.set_lose_callback(lambda app_self: self.reset_solver())
+        self.app.set_win_callback(lambda app_self: self.game_over())
+        self.app.set_lose_callback(lambda app_self: self.game_over())
+
+    def game_over(self):
+        if profiling.profiler is not None:
+            profiling.profiler.end_game(self.game.won)
+        self.reset_solver()
+
+    def attach_game(self, game):
+        '''Play directly on a MinesweeperEngine, without an app. Use
+        .make_move() or .play_game() instead of .start()'''
+        self.app = None
+        self.game = game
+        self.attached = True
+        if profiling.profiler is not None:
+            profiling.profiler.end_game() #if the last one wasn't finished
+        self.reset_solver()
 
     def _clean_lists(self):
-        i = 0
-        while i < len(self.to_open):
-            j = self.to_open[i]
-            x, y = self.unexplored_cells[j]
-            if self.game.is_opened(x, y):
-                self.to_open.remove(j)
-            else:
-                i += 1
-        i = 0
-        while i < len(self.to_flag):
-            j = self.to_flag[i]
-            x, y = self.unexplored_cells[j]
-            if self.game.is_flagged(x, y):
-                self.to_flag.remove(j)
-            else:
-                i += 1
+        '''Remove opened or flagged squares from to_open, and flagged squares
+        from to_flag'''
+        if self.to_open:
+            to_open = np.array(self.to_open)
+            xs, ys = self.analysis.cell_coords[to_open].T
+            self.to_open = to_open[self.grid[xs, ys] == -1].tolist()
+        if self.to_flag:
+            to_flag = np.array(self.to_flag)
+            xs, ys = self.analysis.cell_coords[to_flag].T
+            self.to_flag = to_flag[self.grid[xs, ys] != -2].tolist()
 
-    def single_move(self):
+    def find_trivial_moves(self):
+        '''Add the sure positions found by find_trivial_cells() to
+        self.to_flag and self.to_open, without updating the analysis (it is
+        brought up to date with these moves when it's next needed).
+        -> whether any were found'''
+        prof = profiling.profiler
+        if prof is not None:
+            start = time.perf_counter()
+        sure_mines, sure_safe = find_trivial_cells(self.grid)
+        cell_index = self.analysis.cell_index
+        self.to_flag.extend(cell_index[sure_mines].tolist())
+        self.to_open.extend(cell_index[sure_safe].tolist())
+        if prof is not None:
+            prof.add('trivial', start)
+        return bool(self.to_flag or self.to_open)
+
+    def update_analysis(self):
+        '''Bring self.analysis up to date with the moves made since the last
+        update, and add any new sure positions to self.to_flag and self.to_open'''
+        prof = profiling.profiler
+        if prof is not None:
+            start = time.perf_counter()
+        if self.analysis is None:
+            self.analysis = RulesetAnalysis(self.grid, self.game.get_mine_number())
+        else:
+            revealed = (np.concatenate(self.revealed) if self.revealed
+                        else ())
+            self.analysis.update(revealed, self.flagged)
+        self.revealed = []
+        self.flagged = []
+        if not self.analysis.is_possible():
+            raise Exception("No possible positions: there's been a mistake")
+        self.unexplored_cells = self.analysis.unexplored_cells
+        self.sure_mine_positions = self.analysis.sure_mine_positions
+        self.sure_safe_positions = self.analysis.sure_safe_positions
+        new_mines, new_safe = self.analysis.take_new_positions()
+        self.to_flag.extend(new_mines)
+        self.to_open.extend(new_safe)
+        #remove already flagged/open squares from to_flag and to_open
+        self._clean_lists()
+        if prof is not None:
+            prof.add('analysis', start)
+
+    def get_mine_probs(self):
+        '''Used to choose a square when we need to guess. Subclasses can
+        override this to guess differently.
+        -> array of mine probabilities, with the same shape as the grid'''
+        #try to find a low-risk square without knowing exact probabilities
+        return estimate_probs(
+            self.grid, self.unexplored_cells,
+            self.analysis.get_cell_groups(),
+            self.game.get_mine_counter(),
+            self.sure_mine_positions, self.sure_safe_positions
+        )
+
+    def make_move(self):
+        '''Flag every square in self.to_flag, or else open every square in
+        self.to_open (each in one call to self.game), or else guess one
+        square'''
+        prof = profiling.profiler
+        if prof is not None:
+            prof.start_move()
+        if self.analysis is not None and self.game.num_moves != self.moves_seen:
+            #start again from the grid, as the analysis does when it's new
+            self.analysis = None
+            self.revealed, self.flagged = [], []
+            self.to_flag, self.to_open = [], []
         if not (self.to_flag or self.to_open):
-            self.game.get_grid(self.grid)
-            num_mines = self.game.get_mine_number()
-            (is_possible, unexplored_cells, cell_groups,
-             sure_mine_positions, sure_safe_positions
-            ) = analyse_with_ruleset(self.grid, num_mines)
-            if not is_possible:
-                raise Exception("No possible positions: there's been a mistake")
-            self.unexplored_cells = unexplored_cells
-            self.sure_mine_positions = sure_mine_positions
-            self.to_flag = list(sure_mine_positions)
-            self.sure_safe_positions = sure_safe_positions
-            self.to_open = list(sure_safe_positions)
-            self.cell_groups = cell_groups
-            #remove already flagged/open squares from to_flag and to_open
-            self._clean_lists()
+            #most positions only need the trivial rules
+            if self.analysis is None or not self.find_trivial_moves():
+                self.update_analysis()
+        if prof is not None:
+            start = time.perf_counter()
 
+        #in the app, a move that ends the game runs the win/lose callback,
+        # which resets the solver for the next game before the move returns
+        num_resets = self.num_resets
+        #(in the order they would be popped off the lists one at a time)
         if self.to_flag:
-            x, y = self.unexplored_cells[self.to_flag.pop()]
-            self.game.set_flag(x, y)
+            xs, ys = self.analysis.cell_coords[self.to_flag[::-1]].T
+            kind, squares = 'flag', len(self.to_flag)
+            self.to_flag = []
+            self.game.flag_squares(xs, ys)
         elif self.to_open:
-            x, y = self.unexplored_cells[self.to_open.pop()]
-            self.game.open_square_with_splash(x, y)
-            self._clean_lists()
+            xs, ys = self.analysis.cell_coords[self.to_open[::-1]].T
+            self.to_open = []
+            kind, squares = 'open', self.game.open_squares(xs, ys)
         else:
-            #need to guess - try to find a low-risk square without
-            # knowing exact probabilities
-            mine_probs = estimate_probs(
-                self.grid, self.unexplored_cells, self.cell_groups,
-                self.game.get_mine_counter(),
-                self.sure_mine_positions, self.sure_safe_positions
-            )
+            kind, squares = 'guess', 1
+            #need to guess - try to find a low-risk square
+            self.guess_count += 1
+            mine_probs = self.get_mine_probs()
+            if prof is not None:
+                prof.add('probabilities', start)
+                start = time.perf_counter()
             min_prob = np.min(mine_probs)
             x_indices, y_indices = np.where(mine_probs == min_prob)
-            i = random.randint(0, len(x_indices)-1)
+            i = self.rng.integers(len(x_indices))
             #print('guess', min_prob)
             self.game.open_square_with_splash(x_indices[i], y_indices[i])
-            self._clean_lists()
+        #the solver's state belongs to this game, unless it was reset
+        if self.num_resets == num_resets:
+            if kind == 'flag':
+                self.flagged.extend(zip(xs.tolist(), ys.tolist()))
+            else:
+                self.revealed.append(self.game.last_revealed)
+                self._clean_lists()
+            self.move_count += squares
+            self.moves_seen = self.game.num_moves
+        if prof is not None:
+            prof.add('moves', start)
+            prof.end_move(kind, squares)
+
+    def single_move(self):
+        '''Make one move, and start a new game if this one is over.
+        Called by the app when the AI is running'''
+        self.make_move()
         if self.game.lost:
             self.loss_count += 1
         if self.game.won:
             self.win_count += 1
-        if self.game.lost or self.game.won and not self.stopped:
+        #(also when the game was ended by a single move while stopped)
+        if self.game.lost or self.game.won:
             self.stop()
             #start a new game
             if (self.num_games is None
                 or self.win_count + self.loss_count < self.num_games):
                 self.delayed_new_game()
             if self.win_count + self.loss_count == self.num_games:
-                print('Wins:', ai_player.win_count)
-                print('Losses:', ai_player.loss_count)
+                print('Wins:', self.win_count)
+                print('Losses:', self.loss_count)
+
+    def play_game(self, game):
+        '''Play a game on a MinesweeperEngine until it is won or lost, as fast
+        as possible. The engine should have a new game set up.
+        -> GameResult'''
+        self.attach_game(game)
+        start_time = time.perf_counter()
+        while not (game.won or game.lost):
+            self.make_move()
+        seconds = time.perf_counter() - start_time
+        if profiling.profiler is not None:
+            profiling.profiler.end_game(game.won)
+        if game.won:
+            self.win_count += 1
+        else:
+            self.loss_count += 1
+        return GameResult(game.won, self.move_count, self.guess_count, seconds)
+
+    def play_moves(self):
+        '''Make moves for up to self.batch_time_ms, or until the AI stops at
+        the end of a game (if newgame_delay is 0, the next game is started
+        straight away, and played in the same batch). Called by the app every
+        frame when move_delay is 0'''
+        end_time = time.perf_counter() + self.batch_time_ms / 1000
+        while not self.stopped and time.perf_counter() < end_time:
+            self.single_move()
 
     def start(self):
-        self.app.add_delayed_action(self.name + ': running',
-            self.move_delay, self.single_move, repeat=True
+        if not self.stopped:
+            return
+        self.running_action = self.app.add_delayed_action(
+            self.name + ': running', self.move_delay,
+            self.play_moves if self.move_delay == 0 else self.single_move,
+            repeat=True
         )
         self.stopped = False
 
     def stop(self):
-        self.app.cancel_delayed_action(self.name + ': running')
+        if self.running_action is not None:
+            self.running_action.cancel()
+            self.running_action = None
         self.stopped = True
 
     def pause_play(self):
@@ -339,13 +1128,44 @@ class BasicRulesetAI:
     def new_game(self):
         self.app.new_game()
 ##        self.reset_solver() #not needed because we have set win/lose callbacks
-        self.app.add_delayed_action(self.name + ': solve new game',
-            100, self.start
-        )
+        #show the new board for a moment before solving it, unless there
+        # are no delays, when the next batch of moves carries straight on
+        start_delay = min(100, self.newgame_delay)
+        if start_delay == 0:
+            self.start()
+        else:
+            self.app.add_delayed_action(self.name + ': solve new game',
+                start_delay, self.start
+            )
 
     def delayed_new_game(self):
-        self.app.add_delayed_action(self.name + ': delay for new game',
-            self.newgame_delay, self.new_game)
+        if self.newgame_delay == 0:
+            self.new_game()
+        else:
+            self.app.add_delayed_action(self.name + ': delay for new game',
+                self.newgame_delay, self.new_game)
+
+class ExactProbabilityAI(BasicRulesetAI):
+    '''Uses the same ruleset, but when it has to guess, it calculates the
+    exact probability of each square being a mine (see exact_probs()).
+    pool - a multiprocessing.Pool to solve big frontier components in, in
+           parallel (owned by the caller), or None to solve them all in this
+           process. It only makes a difference on big boards'''
+    name = 'Exact Probability AI'
+
+    def __init__(self, *args, pool=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = pool
+
+    def get_mine_probs(self):
+        num_mines_unsure = (self.game.get_mine_number()
+                            - len(self.sure_mine_positions))
+        return exact_probs(
+            self.grid, self.unexplored_cells,
+            self.analysis.get_cell_groups(), num_mines_unsure,
+            self.sure_mine_positions, self.sure_safe_positions,
+            pool=self.pool
+        )
 
 if __name__ == '__main__':
     from minesweeper import *
@@ -0,0 +1,240 @@
+'''Timing of the solver's hot paths, per move and per game, to find out where
+its time goes. Profiling is switched on and off at runtime; while it is off,
+the solver only checks `profiling.profiler is None` once per phase.
+
+    import profiling
+    profiler = profiling.enable()
+    ai_player.play_game(engine)
+    profiling.disable()
+    print(profiler.summary())
+    profiler.save_jsonl('profile.jsonl')       #one JSON object per move/game
+    profiler.save_chrome_trace('trace.json')   #chrome://tracing or Perfetto
+
+    python profiling.py -n 50 --ai exact --width 30 --height 16 --mines 99
+
+Phases (see PHASES) are timed as spans, which are added up for each move and
+each game. Phases can be inside other phases (eg propagate is part of
+analysis), so their times don't add up to the total. 'edges' is made of
+thousands of tiny pieces, so it only appears in the totals, not the trace.
+Counts (eg how many times each rule of the ruleset fired, see RULES in
+minesweeper_ai.py) are added up in the same way.'''
+import argparse, json, os, time
+
+#the profiler that instrumented code reports to, or None when profiling is off
+profiler = None
+
+#what the phases of a move measure
+PHASES = {
+    'trivial' : 'find_trivial_cells() over the whole grid',
+    'analysis' : 'bringing the RulesetAnalysis up to date (includes groups, '
+                 'edges and propagate)',
+    'groups' : 'making groups from the numbers of newly opened cells',
+    'edges' : 'linking new groups to the groups they intersect',
+    'propagate' : 'applying the ruleset until nothing changes',
+    'probabilities' : 'mine probabilities, when the solver has to guess',
+    'moves' : 'opening and flagging squares in the game',
+}
+
+def enable(new_profiler=None):
+    '''Start sending timings to new_profiler (a new Profiler if None).
+    -> the Profiler'''
+    global profiler
+    profiler = new_profiler if new_profiler is not None else Profiler()
+    return profiler
+
+def disable():
+    '''Stop profiling. The open game (if any) is finished first.
+    -> the Profiler that was active, or None'''
+    global profiler
+    old_profiler, profiler = profiler, None
+    if old_profiler is not None:
+        old_profiler._move = None #a move can't be finished after this
+        old_profiler.end_game()
+    return old_profiler
+
+def _add_to(totals, key, value):
+    totals[key] = totals.get(key, 0) + value
+
+class Profiler:
+    '''Collects the timings of moves and games. Moves and games are started
+    by the solver as it plays; times are from time.perf_counter().
+    keep_spans - keep every span (needed for save_chrome_trace()). Without
+                 them, only the totals of each move and game are kept'''
+    def __init__(self, keep_spans=True):
+        self.keep_spans = keep_spans
+        self.spans = [] #(name, start, end, args dict or None)
+        self.moves = [] #dict for each finished move, see end_move()
+        self.games = [] #dict for each finished game, see end_game()
+        self.origin = time.perf_counter()
+        self._move = None
+        self._game = None
+        #(won,) if the game ended during the current move, see end_game()
+        self._game_over = None
+
+    def add(self, phase, start, end=None):
+        '''Record a span of time spent in a phase, from `start` (a
+        time.perf_counter() value) until `end` (default: now)'''
+        if end is None:
+            end = time.perf_counter()
+        if self.keep_spans:
+            self.spans.append((phase, start, end, None))
+        if self._move is not None:
+            _add_to(self._move['phases'], phase, end - start)
+
+    def add_time(self, phase, seconds):
+        '''Add time spent in a phase to the current move, without a span
+        (for phases made up of many short pieces)'''
+        if self._move is not None:
+            _add_to(self._move['phases'], phase, seconds)
+
+    def count(self, name, n=1):
+        '''Add n to a count for the current move'''
+        if self._move is not None:
+            _add_to(self._move['counts'], name, n)
+
+    def start_move(self):
+        if self._game is None:
+            self.start_game()
+        self._move = {'game' : self._game['game'],
+                      'move' : self._game['moves'],
+                      'start' : time.perf_counter(),
+                      'phases' : {}, 'counts' : {}}
+
+    def end_move(self, kind, squares):
+        '''kind - 'flag', 'open' or 'guess'
+        squares - how many squares the move flagged or opened'''
+        move = self._move
+        if move is None:
+            return
+        self._move = None
+        end = time.perf_counter()
+        move['seconds'] = end - move['start']
+        move['kind'] = kind
+        move['squares'] = squares
+        if self.keep_spans:
+            self.spans.append(('move', move['start'], end,
+                               {'move' : move['move'], 'kind' : kind,
+                                'squares' : squares}))
+        self.moves.append(move)
+        game = self._game
+        game['moves'] += 1
+        for phase, seconds in move['phases'].items():
+            _add_to(game['phases'], phase, seconds)
+        for name, n in move['counts'].items():
+            _add_to(game['counts'], name, n)
+        if self._game_over is not None:
+            self.end_game(*self._game_over)
+
+    def start_game(self):
+        self.end_game()
+        self._game = {'game' : len(self.games),
+                      'start' : time.perf_counter(),
+                      'moves' : 0, 'phases' : {}, 'counts' : {}}
+
+    def end_game(self, won=None):
+        '''Finish the current game (if there is one). won can be None if it
+        isn't known. If a move is in progress (eg the game was ended by a
+        callback run by the move), the game is finished when the move ends,
+        so that the last move is counted in it'''
+        game = self._game
+        if game is None:
+            return
+        if self._move is not None:
+            self._game_over = (won,)
+            return
+        self._game_over = None
+        self._game = None
+        end = time.perf_counter()
+        game['seconds'] = end - game['start']
+        game['won'] = won
+        if self.keep_spans:
+            self.spans.append(('game', game['start'], end,
+                               {'game' : game['game'], 'won' : won}))
+        self.games.append(game)
+
+    def totals(self):
+        '''-> phases, counts: dicts of totals over every finished game'''
+        phases, counts = {}, {}
+        for game in self.games:
+            for phase, seconds in game['phases'].items():
+                _add_to(phases, phase, seconds)
+            for name, n in game['counts'].items():
+                _add_to(counts, name, n)
+        return phases, counts
+
+    def summary(self):
+        '''-> str, a table of where the time went'''
+        phases, counts = self.totals()
+        total = sum(game['seconds'] for game in self.games)
+        lines = [f'{len(self.games)} games, {len(self.moves)} moves, '
+                 f'{1000 * total:.1f} ms']
+        for phase in sorted(phases, key=phases.get, reverse=True):
+            lines.append(f'  {phase:14} {1000 * phases[phase]:10.2f} ms '
+                         f'{phases[phase] / total if total else 0:7.1%}')
+        for name in sorted(counts):
+            lines.append(f'  {name:30} {counts[name]:10}')
+        return '\n'.join(lines)
+
+    def save_jsonl(self, filepath):
+        '''Save one JSON object per line: every move, then every game, told
+        apart by their "type". Times are in seconds, from the profiler's
+        creation'''
+        with open(filepath, mode='w') as file:
+            for type_, records in (('move', self.moves), ('game', self.games)):
+                for record in records:
+                    record = dict(record, type=type_,
+                                  start=record['start'] - self.origin)
+                    file.write(json.dumps(record) + '\n')
+
+    def save_chrome_trace(self, filepath):
+        '''Save the spans in the Trace Event Format, which chrome://tracing
+        and https://ui.perfetto.dev open'''
+        assert self.keep_spans, 'The profiler was made with keep_spans=False'
+        pid = os.getpid()
+        events = []
+        for name, start, end, args in self.spans:
+            event = {'name' : name, 'ph' : 'X', 'pid' : pid, 'tid' : 0,
+                     'ts' : 1e6 * (start - self.origin),
+                     'dur' : 1e6 * (end - start)}
+            if args is not None:
+                event['args'] = args
+            events.append(event)
+        with open(filepath, mode='w') as file:
+            json.dump({'traceEvents' : events, 'displayTimeUnit' : 'ms'},
+                      file)
+
+if __name__ == '__main__':
+    from batch import AI_CLASSES, game_seeds
+    from engine import MinesweeperEngine
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', '--games', type=int, default=20)
+    parser.add_argument('--ai', choices=sorted(AI_CLASSES), default='basic')
+    parser.add_argument('--width', type=int, default=30)
+    parser.add_argument('--height', type=int, default=16)
+    parser.add_argument('--mines', type=int, default=None,
+                        help='number of mines (overrides --density)')
+    parser.add_argument('--density', type=float, default=0.17)
+    parser.add_argument('--seed', type=int, default=0, help='root seed')
+    parser.add_argument('--jsonl', default=None,
+                        help='save every move and game to this file')
+    parser.add_argument('--trace', default=None,
+                        help='save a Chrome trace to this file')
+    args = parser.parse_args()
+
+    #the solver reports to the imported module, not to this script
+    import profiling
+    ai_player = AI_CLASSES[args.ai]()
+    run_profiler = profiling.enable(
+        profiling.Profiler(keep_spans=args.trace is not None))
+    for i in range(args.games):
+        board_seed, ai_seed = game_seeds(args.seed, i)
+        ai_player.set_seed(ai_seed)
+        ai_player.play_game(MinesweeperEngine(
+            args.width, args.height, mine_number=args.mines,
+            mine_density=args.density, seed=board_seed))
+    profiling.disable()
+    print(run_profiler.summary())
+    if args.jsonl is not None:
+        run_profiler.save_jsonl(args.jsonl)
+    if args.trace is not None:
+        run_profiler.save_chrome_trace(args.trace)
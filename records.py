@@ -0,0 +1,199 @@
+'''Compact binary records of games: the board, every move that was made, and
+the seed the board came from, so that any game can be played again exactly,
+in the app or by a solver. Records are appended to a log file one after
+another, and read back one at a time, so a log can hold millions of games.
+
+    engine = MinesweeperEngine(30, 16, mine_number=99, record_moves=True)
+    ...play a game...
+    with RecordWriter('games.rec') as log:
+        log.write(GameRecord.from_engine(engine))
+
+    for record in read_records('games.rec'):
+        result = ai_player.play_game(record.new_engine())
+
+File format (numbers are little-endian): the file starts with FILE_MAGIC,
+followed by the records. Each record is
+    header  - see RECORD_HEADER: grid_width (u16), grid_height (u16),
+              mine_number (u32), seed (u128), index (u32),
+              number of moves (u32), flags (u8, see WON, LOST and HAS_SEED)
+    mines   - one bit per square, in flat index order (x * grid_height + y),
+              packed by np.packbits
+    moves   - one u32 per move: flat index << 3 | kind (the MOVE_* constants
+              in engine.py)
+
+    python records.py games.rec            #summary of the games in a log
+    python records.py games.rec --ai exact #check an AI still plays them
+                                           # the same way'''
+import argparse, struct
+from dataclasses import dataclass
+
+import numpy as np
+
+from engine import MinesweeperEngine
+
+FILE_MAGIC = b'MSWPREC1'
+RECORD_HEADER = struct.Struct('<HHI16sIIB')
+#flags
+WON, LOST, HAS_SEED = 1, 2, 4
+
+@dataclass
+class GameRecord:
+    grid_width : int
+    grid_height : int
+    mine_bitmap : np.ndarray #uint8, the mines packed by np.packbits
+    moves : np.ndarray #uint32, flat index << 3 | kind
+    seed : int = None #what the board was generated from, if it is known
+    index : int = 0 #which game from that seed (eg its number in a batch)
+    won : bool = False
+    lost : bool = False
+    mine_number : int = None #worked out from the bitmap if not given
+
+    def __post_init__(self):
+        if self.mine_number is None:
+            self.mine_number = int(np.count_nonzero(self.mine_mask))
+
+    @classmethod
+    def from_engine(cls, engine, seed=None, index=0):
+        '''Record the game being played on a MinesweeperEngine created with
+        record_moves=True. The mines are recorded as they are now, so this
+        should be called once the game is over (or at least after the first
+        move, which can move mines, see first_click)
+        -> GameRecord'''
+        assert engine.move_log is not None,\
+               'The engine should be created with record_moves=True'
+        mine_mask = (engine._flat_grid & 0b10000) != 0
+        moves = np.array(engine.move_log, dtype=np.uint32).reshape(-1, 2)
+        return cls(engine.grid_width, engine.grid_height,
+                   np.packbits(mine_mask), moves[:, 1] << 3 | moves[:, 0],
+                   seed, index, engine.won, engine.lost)
+
+    @property
+    def mine_mask(self):
+        '''-> bool np.ndarray over the flat grid, True for mined squares'''
+        return np.unpackbits(self.mine_bitmap,
+                             count=self.grid_width * self.grid_height
+                             ).view(bool)
+
+    def iter_moves(self):
+        '''-> iterator of (kind, x, y) of every move, in order'''
+        xs, ys = np.divmod(self.moves >> 3, self.grid_height)
+        return zip((self.moves & 0b111).tolist(), xs.tolist(), ys.tolist())
+
+    def new_engine(self, **kwargs):
+        '''-> MinesweeperEngine, with a new game set up on this board.
+        kwargs are passed to MinesweeperEngine()'''
+        engine = MinesweeperEngine(self.grid_width, self.grid_height,
+                                   mine_density=None, mine_locations=(),
+                                   **kwargs)
+        engine.load_board(self.mine_mask)
+        return engine
+
+    def replay(self, game):
+        '''Start a new game on this board and make the recorded moves on
+        `game` (a MinesweeperEngine or a MinesweeperGrid), one at a time.
+        -> iterator, which makes the next move every time it is advanced, and
+           gives (kind, x, y) of that move'''
+        game.load_board(self.mine_mask)
+        for kind, x, y in self.iter_moves():
+            game.play_move(kind, x, y)
+            yield kind, x, y
+
+    def to_bytes(self):
+        '''-> bytes of the record, in the format described in records.py'''
+        assert self.grid_width * self.grid_height < 2**29,\
+               'Grid too big to record'
+        flags = WON * self.won | LOST * self.lost
+        seed = 0
+        if self.seed is not None:
+            flags |= HAS_SEED
+            seed = int(self.seed)
+            assert 0 <= seed < 2**128, 'Seed should fit in 128 bits'
+        header = RECORD_HEADER.pack(self.grid_width, self.grid_height,
+                                    self.mine_number,
+                                    seed.to_bytes(16, 'little'),
+                                    self.index, len(self.moves), flags)
+        return b''.join((header, self.mine_bitmap.tobytes(),
+                         self.moves.astype('<u4').tobytes()))
+
+class RecordWriter:
+    '''Appends GameRecords to a log file, which is created if it doesn't
+    exist. Use as a context manager, or call .close() when done'''
+    def __init__(self, filepath):
+        self.file = open(filepath, mode='ab')
+        if self.file.tell() == 0:
+            self.file.write(FILE_MAGIC)
+
+    def write(self, record):
+        self.file.write(record.to_bytes())
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _read_exactly(file, num_bytes):
+    data = file.read(num_bytes)
+    assert len(data) == num_bytes, f'Truncated record in {file.name}'
+    return data
+
+def read_records(filepath):
+    '''Read the records in a log file one at a time, so the whole file is
+    never in memory.
+    -> iterator of GameRecord'''
+    with open(filepath, mode='rb') as file:
+        assert file.read(len(FILE_MAGIC)) == FILE_MAGIC,\
+               f'{filepath} is not a game record file'
+        while True:
+            header = file.read(RECORD_HEADER.size)
+            if not header:
+                return
+            assert len(header) == RECORD_HEADER.size,\
+                   f'Truncated record in {filepath}'
+            (grid_width, grid_height, mine_number, seed, index, num_moves,
+             flags) = RECORD_HEADER.unpack(header)
+            num_squares = grid_width * grid_height
+            mine_bitmap = np.frombuffer(
+                _read_exactly(file, (num_squares + 7) // 8), dtype=np.uint8)
+            moves = np.frombuffer(_read_exactly(file, 4 * num_moves),
+                                  dtype='<u4').astype(np.uint32)
+            yield GameRecord(grid_width, grid_height, mine_bitmap, moves,
+                             (int.from_bytes(seed, 'little')
+                              if flags & HAS_SEED else None),
+                             index, bool(flags & WON), bool(flags & LOST),
+                             mine_number)
+
+if __name__ == '__main__':
+    from batch import AI_CLASSES, game_seeds
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('filepath')
+    parser.add_argument('--ai', choices=sorted(AI_CLASSES), default=None,
+                        help='play this AI again on every board, and report '
+                             'the games it now plays differently')
+    args = parser.parse_args()
+
+    ai_player = AI_CLASSES[args.ai]() if args.ai is not None else None
+    games = wins = moves = changed = changed_results = 0
+    for record in read_records(args.filepath):
+        games += 1
+        wins += record.won
+        moves += len(record.moves)
+        if ai_player is None:
+            continue
+        #a game from a batch is played with the same random stream
+        ai_player.set_seed(game_seeds(record.seed, record.index)[1]
+                           if record.seed is not None else None)
+        engine = record.new_engine(record_moves=True)
+        result = ai_player.play_game(engine)
+        if result.won != record.won:
+            changed_results += 1
+        if not np.array_equal(GameRecord.from_engine(engine).moves,
+                              record.moves):
+            changed += 1
+    print(f'{games} games, {wins} won, {moves} moves')
+    if ai_player is not None:
+        print(f'{ai_player.name}: {changed} games played differently, '
+              f'{changed_results} with a different result')
@@ -30,6 +30,8 @@ class Settings:
         self.mine_number = save_obj['game']['mine_number']
         self.mine_locations = save_obj['game']['mine_locations']
         self.seed = save_obj['game']['seed']
+        #(settings files saved before first_click was added don't have it)
+        self.first_click = save_obj['game'].get('first_click', 'relocate')
 
     def save_to_file(self, filepath=None):
         if filepath is None:
@@ -58,6 +60,7 @@ class Settings:
         save_obj['game']['mine_number'] = self.mine_number
         save_obj['game']['mine_locations'] = self.mine_locations
         save_obj['game']['seed'] = self.seed
+        save_obj['game']['first_click'] = self.first_click
         with open(filepath, mode='w') as file:
             json.dump(save_obj, file, indent=4)
 
@@ -84,3 +87,4 @@ class Settings:
         self.mine_number = None
         self.mine_locations = None
         self.seed = None
+        self.first_click = 'relocate' #see MinesweeperEngine